@@ -0,0 +1,102 @@
+"""
+Micro-benchmark for IntegrationItem: memory per item and serialization throughput.
+
+Compares the previous dict-backed class serialized through FastAPI's
+jsonable_encoder with the slotted IntegrationItem serialized via to_dict().
+
+    cd backend
+    python -m benchmarks.bench_integration_item --items 100000
+"""
+
+import argparse
+import gc
+import json
+import time
+import tracemalloc
+
+from fastapi.encoders import jsonable_encoder
+
+from integrations.integration_item import IntegrationItem
+
+
+class LegacyIntegrationItem:
+    """The pre-__slots__ IntegrationItem, kept here as the baseline."""
+
+    def __init__(self, **fields):
+        for field in IntegrationItem.__slots__:
+            setattr(self, field, None)
+        self.directory = False
+        self.visibility = True
+        for key, value in fields.items():
+            setattr(self, key, value)
+
+
+def contact_fields(i: int) -> dict:
+    # Shaped like what get_items_hubspot builds for a contact
+    return dict(
+        id=str(100000 + i),
+        name=f'First{i}',
+        email=f'contact{i}@example.com',
+        last_name=f'Last{i}',
+        type='Contact',
+        creation_time='2024-01-01T00:00:00.000Z',
+        last_modified_time='2024-06-01T12:34:56.789Z',
+    )
+
+
+def measure_memory(cls, count: int) -> float:
+    """Bytes allocated per item for `count` items of `cls`."""
+    fields = [contact_fields(i) for i in range(count)]
+    gc.collect()
+    tracemalloc.start()
+    before, _ = tracemalloc.get_traced_memory()
+    items = [cls(**f) for f in fields]
+    after, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del items
+    return (after - before) / count
+
+
+def measure_serialization(items: list, serialize, repeat: int) -> float:
+    """Best-of-`repeat` items serialized per second."""
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        json.dumps(serialize(items))
+        best = min(best, time.perf_counter() - start)
+    return len(items) / best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--items', type=int, default=100000)
+    parser.add_argument('--repeat', type=int, default=3)
+    args = parser.parse_args()
+
+    legacy_items = [LegacyIntegrationItem(**contact_fields(i)) for i in range(args.items)]
+    slotted_items = [IntegrationItem(**contact_fields(i)) for i in range(args.items)]
+
+    results = {
+        'items': args.items,
+        'legacy': {
+            'bytes_per_item': round(measure_memory(LegacyIntegrationItem, args.items), 1),
+            'items_per_sec': round(measure_serialization(legacy_items, jsonable_encoder, args.repeat)),
+        },
+        'slotted': {
+            'bytes_per_item': round(measure_memory(IntegrationItem, args.items), 1),
+            'items_per_sec': round(measure_serialization(
+                slotted_items, lambda items: [item.to_dict() for item in items], args.repeat
+            )),
+        },
+    }
+    results['memory_ratio'] = round(
+        results['slotted']['bytes_per_item'] / results['legacy']['bytes_per_item'], 3
+    )
+    results['throughput_speedup'] = round(
+        results['slotted']['items_per_sec'] / results['legacy']['items_per_sec'], 2
+    )
+    print(json.dumps(results, indent=2))
+
+
+if __name__ == '__main__':
+    main()
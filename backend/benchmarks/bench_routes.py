@@ -0,0 +1,334 @@
+"""
+Offline load benchmark for the main.py routes, against the local mock providers.
+
+Starts benchmarks.mock_providers in a subprocess, points the integrations at
+it, then drives the FastAPI app in-process (ASGI, lifespan included) with
+`--concurrency` concurrent clients. For every scenario it reports throughput,
+p50/p95/p99 latency, event-loop lag and RSS as JSON. Needs a reachable Redis
+(REDIS_HOST / REDIS_PORT as usual).
+
+    cd backend
+    python -m benchmarks.bench_routes --requests 200 --concurrency 20 --latency-ms 30
+    python -m benchmarks.bench_routes --scenarios hubspot_load,notion_load --rate-429 0.05 --output before.json
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import resource
+import socket
+import subprocess
+import sys
+import time
+from urllib.parse import parse_qs, urlsplit
+
+import httpx
+
+SCENARIOS = [
+    'hubspot_authorize',
+    'hubspot_oauth2callback',
+    'hubspot_load',
+    'hubspot_load_incremental',
+    'hubspot_items',
+    'hubspot_contact_get',
+    'hubspot_contact_create',
+    'hubspot_contact_update',
+    'hubspot_contact_delete',
+    'airtable_authorize',
+    'airtable_oauth2callback',
+    'airtable_load',
+    'notion_authorize',
+    'notion_oauth2callback',
+    'notion_load',
+    'notion_items',
+]
+ORG_ID = 'bench-org'
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_mock_server(args, port: int) -> subprocess.Popen:
+    command = [
+        sys.executable, '-m', 'benchmarks.mock_providers',
+        '--port', str(port),
+        '--latency-ms', str(args.latency_ms),
+        '--jitter-ms', str(args.jitter_ms),
+        '--pages', str(args.pages),
+        '--page-size', str(args.page_size),
+        '--payload-bytes', str(args.payload_bytes),
+        '--rate-429', str(args.rate_429),
+        '--retry-after', str(args.retry_after),
+    ]
+    process = subprocess.Popen(command, cwd=os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+    deadline = time.monotonic() + 15
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f'http://127.0.0.1:{port}/health', timeout=0.5)
+            return process
+        except httpx.HTTPError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError('Mock provider server did not come up')
+
+
+def rss_mb() -> float:
+    """Current resident set size of this process."""
+    try:
+        with open('/proc/self/status') as status:
+            for line in status:
+                if line.startswith('VmRSS:'):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    # No procfs (macOS): fall back to the peak
+    return peak_rss_mb()
+
+
+def peak_rss_mb() -> float:
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports KiB, macOS bytes
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def percentile(sorted_values: list, pct: float) -> float:
+    """Nearest-rank percentile of an already sorted list."""
+    if not sorted_values:
+        return 0.0
+    rank = max(0, min(len(sorted_values) - 1, math.ceil(pct / 100 * len(sorted_values)) - 1))
+    return sorted_values[rank]
+
+
+class LoopLagMonitor:
+    """Samples how late the event loop wakes a sleeping task, i.e. how long it was blocked."""
+
+    def __init__(self, interval: float = 0.01):
+        self.interval = interval
+        self.samples = []
+        self._task = None
+
+    async def _run(self):
+        while True:
+            start = time.perf_counter()
+            await asyncio.sleep(self.interval)
+            self.samples.append(max(0.0, time.perf_counter() - start - self.interval))
+
+    def start(self):
+        self.samples = []
+        self._task = asyncio.ensure_future(self._run())
+
+    async def stop(self) -> dict:
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        samples = sorted(self.samples)
+        return {
+            'mean_ms': round(1000 * sum(samples) / len(samples), 3) if samples else 0.0,
+            'p99_ms': round(1000 * percentile(samples, 99), 3),
+            'max_ms': round(1000 * samples[-1], 3) if samples else 0.0,
+        }
+
+
+async def authorize(client: httpx.AsyncClient, provider: str, user_id: str) -> str:
+    response = await client.post(
+        f'/integrations/{provider}/authorize', data={'user_id': user_id, 'org_id': ORG_ID}
+    )
+    response.raise_for_status()
+    return response.json()
+
+
+def state_from_url(url: str) -> str:
+    return parse_qs(urlsplit(url).query)['state'][0]
+
+
+async def prepare(client: httpx.AsyncClient, scenario: str, count: int, users: int) -> list:
+    """
+    Per-request arguments for `scenario`, set up beforehand so only the
+    route itself is timed (e.g. an authorize call for every callback).
+    """
+    provider = scenario.split('_')[0]
+    if scenario.endswith('_oauth2callback'):
+        # State is stored per org/user, so every callback needs its own user
+        states = []
+        for i in range(count):
+            url = await authorize(client, provider, f'bench-callback-{i}')
+            states.append(state_from_url(url))
+        return states
+    if scenario.endswith('_items'):
+        # Snapshot reads need a completed load per user first
+        for user in range(min(count, users)):
+            method, path, kwargs = build_request(f'{provider}_load', user, users)
+            response = await client.request(method, path, **kwargs)
+            response.raise_for_status()
+    return list(range(count))
+
+
+def build_request(scenario: str, arg, users: int) -> tuple:
+    """(method, path, kwargs) for one request of `scenario`."""
+    provider = scenario.split('_')[0]
+    user_id = f'bench-user-{arg % users}' if isinstance(arg, int) else None
+    if scenario.endswith('_authorize'):
+        return 'POST', f'/integrations/{provider}/authorize', {'data': {'user_id': user_id, 'org_id': ORG_ID}}
+    if scenario.endswith('_oauth2callback'):
+        return 'GET', f'/integrations/{provider}/oauth2callback', {'params': {'code': 'bench-code', 'state': arg}}
+    if scenario == 'hubspot_load':
+        credentials = json.dumps({'user_id': user_id, 'org_id': ORG_ID})
+        return 'POST', '/integrations/hubspot/load', {'data': {'credentials': credentials}}
+    if scenario == 'hubspot_load_incremental':
+        credentials = json.dumps({'user_id': user_id, 'org_id': ORG_ID})
+        return 'POST', '/integrations/hubspot/load', {
+            'data': {'credentials': credentials, 'sync_mode': 'incremental'}
+        }
+    if scenario.startswith('hubspot_contact_'):
+        action = scenario.rsplit('_', 1)[1]
+        data = {'user_id': user_id, 'org_id': ORG_ID}
+        if action != 'create':
+            data['contact_id'] = str(arg % 100)
+        if action in ('create', 'update'):
+            data['properties_str'] = json.dumps({'email': f'bench{arg}@example.com', 'firstname': 'Bench'})
+        return 'POST', f'/integrations/hubspot/contact/{action}', {'data': data}
+    if scenario == 'hubspot_items':
+        credentials = json.dumps({'user_id': user_id, 'org_id': ORG_ID})
+    else:
+        # airtable / notion take the provider's token response as-is
+        credentials = json.dumps({'access_token': f'bench-token-{arg % users}', 'workspace_id': 'bench-workspace'})
+    if scenario.endswith('_items'):
+        # One page of the snapshot the prepared load left behind
+        return 'POST', f'/integrations/{provider}/items', {
+            'data': {'credentials': credentials, 'offset': str(arg % 5 * 100), 'limit': '100'}
+        }
+    return 'POST', f'/integrations/{provider}/load', {'data': {'credentials': credentials}}
+
+
+async def run_scenario(client: httpx.AsyncClient, scenario: str, args) -> dict:
+    request_args = await prepare(client, scenario, args.requests, args.users)
+    queue = asyncio.Queue()
+    for arg in request_args:
+        queue.put_nowait(arg)
+
+    latencies = []
+    statuses = {}
+
+    async def worker():
+        while not queue.empty():
+            method, path, kwargs = build_request(scenario, queue.get_nowait(), args.users)
+            start = time.perf_counter()
+            response = await client.request(method, path, **kwargs)
+            await response.aread()
+            latencies.append(time.perf_counter() - start)
+            statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    monitor = LoopLagMonitor()
+    monitor.start()
+    started = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(args.concurrency)))
+    elapsed = time.perf_counter() - started
+    loop_lag = await monitor.stop()
+
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': sum(count for status, count in statuses.items() if status >= 400),
+        'status_codes': {str(status): count for status, count in sorted(statuses.items())},
+        'throughput_rps': round(len(latencies) / elapsed, 2) if elapsed else 0.0,
+        'latency_ms': {
+            'p50': round(1000 * percentile(latencies, 50), 2),
+            'p95': round(1000 * percentile(latencies, 95), 2),
+            'p99': round(1000 * percentile(latencies, 99), 2),
+            'max': round(1000 * latencies[-1], 2) if latencies else 0.0,
+        },
+        'event_loop_lag': loop_lag,
+        'rss_mb': round(rss_mb(), 1),
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+    }
+
+
+async def run(args, scenarios: list) -> dict:
+    # Imported only now, so the provider base URLs set in main() are picked up
+    import main as backend
+
+    transport = httpx.ASGITransport(app=backend.app)
+    async with backend.app.router.lifespan_context(backend.app):
+        async with httpx.AsyncClient(transport=transport, base_url='http://bench', timeout=None) as client:
+            # Every HubSpot route needs stored tokens: log the bench users in once
+            for i in range(args.users):
+                url = await authorize(client, 'hubspot', f'bench-user-{i}')
+                response = await client.get(
+                    '/integrations/hubspot/oauth2callback',
+                    params={'code': 'bench-code', 'state': state_from_url(url)},
+                )
+                response.raise_for_status()
+
+            results = {}
+            for scenario in scenarios:
+                results[scenario] = await run_scenario(client, scenario, args)
+                print(f'{scenario}: {results[scenario]["throughput_rps"]} req/s, '
+                      f'p99 {results[scenario]["latency_ms"]["p99"]} ms', file=sys.stderr)
+            return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS),
+                        help='comma-separated subset of: ' + ', '.join(SCENARIOS))
+    parser.add_argument('--requests', type=int, default=100, help='requests per scenario')
+    parser.add_argument('--concurrency', type=int, default=10)
+    parser.add_argument('--users', type=int, default=5, help='distinct users/tokens the requests spread over')
+    parser.add_argument('--latency-ms', type=float, default=20)
+    parser.add_argument('--jitter-ms', type=float, default=5)
+    parser.add_argument('--pages', type=int, default=5)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--payload-bytes', type=int, default=0)
+    parser.add_argument('--rate-429', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=float, default=0)
+    parser.add_argument('--keep-rate-limits', action='store_true',
+                        help="pace requests with the real per-provider limits instead of lifting them")
+    parser.add_argument('--output', help='also write the JSON report to this file')
+    args = parser.parse_args()
+
+    scenarios = [name.strip() for name in args.scenarios.split(',') if name.strip()]
+    unknown = set(scenarios) - set(SCENARIOS)
+    if unknown:
+        parser.error(f'unknown scenarios: {", ".join(sorted(unknown))}')
+
+    port = free_port()
+    base = f'http://127.0.0.1:{port}'
+    os.environ.update({
+        'HUBSPOT_API_BASE': base,
+        'AIRTABLE_API_BASE': base,
+        'AIRTABLE_TOKEN_URL': f'{base}/oauth2/v1/token',
+        'NOTION_API_BASE': base,
+        # The mock is plain HTTP/1.1
+        'HTTP2_ENABLED': 'false',
+    })
+    if not args.keep_rate_limits:
+        for provider in ('HUBSPOT', 'AIRTABLE', 'NOTION'):
+            os.environ.setdefault(f'RATE_LIMIT_{provider}', '1000000/1')
+
+    mock = start_mock_server(args, port)
+    try:
+        results = asyncio.run(run(args, scenarios))
+    finally:
+        mock.terminate()
+        mock.wait()
+
+    report = {
+        'config': {
+            key: value for key, value in vars(args).items() if key not in ('scenarios', 'output')
+        },
+        'python': sys.version.split()[0],
+        'scenarios': results,
+    }
+    output = json.dumps(report, indent=2)
+    print(output)
+    if args.output:
+        with open(args.output, 'w') as report_file:
+            report_file.write(output + '\n')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,234 @@
+"""
+Local stand-in for the HubSpot, Airtable and Notion APIs, for offline benchmarks.
+
+Serves just the endpoints the integrations call, with configurable latency,
+page counts, payload sizes and injected 429s. Point the backend at it with
+HUBSPOT_API_BASE / AIRTABLE_API_BASE / AIRTABLE_TOKEN_URL / NOTION_API_BASE
+(bench_routes.py does this for you).
+
+    cd backend
+    python -m benchmarks.mock_providers --port 8900 --latency-ms 50 --rate-429 0.02
+"""
+
+import argparse
+import asyncio
+import random
+import secrets
+from datetime import datetime
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response
+
+CREATED_AT = '2024-01-01T00:00:00.000Z'
+UPDATED_AT = '2024-06-01T12:34:00.000Z'
+UPDATED_AT_MS = int(datetime.fromisoformat('2024-06-01T12:34:00+00:00').timestamp() * 1000)
+
+
+def create_app(
+    latency_ms: float = 0,
+    jitter_ms: float = 0,
+    pages: int = 5,
+    page_size: int = 100,
+    payload_bytes: int = 0,
+    rate_429: float = 0.0,
+    retry_after: float = 0,
+) -> FastAPI:
+    """
+    Every list endpoint serves `pages` pages of `page_size` records, each
+    padded with `payload_bytes` of filler. Any request may be answered with
+    a 429 (Retry-After: `retry_after`) with probability `rate_429`.
+    """
+    app = FastAPI()
+    total = pages * page_size
+    filler = 'x' * payload_bytes
+    stats = {'requests': 0, 'throttled': 0}
+
+    @app.middleware('http')
+    async def simulate_network(request: Request, call_next):
+        if request.url.path == '/health':
+            return await call_next(request)
+        stats['requests'] += 1
+        delay = latency_ms + random.uniform(0, jitter_ms)
+        if delay:
+            await asyncio.sleep(delay / 1000)
+        if rate_429 and random.random() < rate_429:
+            stats['throttled'] += 1
+            return JSONResponse(
+                {'message': 'rate limited'}, status_code=429, headers={'Retry-After': str(retry_after)}
+            )
+        return await call_next(request)
+
+    @app.get('/health')
+    async def health():
+        return stats
+
+    def tokens():
+        return {
+            'access_token': secrets.token_hex(16),
+            'refresh_token': secrets.token_hex(16),
+            'expires_in': 1800,
+            'token_type': 'bearer',
+        }
+
+    # HubSpot
+
+    def contact(i: int) -> dict:
+        properties = {
+            'firstname': f'First{i}',
+            'lastname': f'Last{i}',
+            'email': f'contact{i}@example.com',
+            'createdate': CREATED_AT,
+            'lastmodifieddate': UPDATED_AT,
+            'hs_object_id': str(i),
+        }
+        if filler:
+            properties['notes'] = filler
+        return {'id': str(i), 'properties': properties, 'createdAt': CREATED_AT,
+                'updatedAt': UPDATED_AT, 'archived': False}
+
+    def contacts_page(after: int, limit: int) -> dict:
+        page = {'results': [contact(i) for i in range(after, min(after + limit, total))]}
+        if after + limit < total:
+            page['paging'] = {'next': {'after': str(after + limit)}}
+        return page
+
+    @app.post('/oauth/v1/token')
+    async def hubspot_token():
+        return tokens()
+
+    @app.get('/crm/v3/objects/contacts')
+    async def hubspot_list(limit: int = 100, after: int = 0):
+        return contacts_page(after, limit)
+
+    @app.post('/crm/v3/objects/contacts/search')
+    async def hubspot_search(request: Request):
+        body = await request.json()
+        since = int(body['filterGroups'][0]['filters'][0]['value'])
+        # Every mock contact was last modified at UPDATED_AT
+        if since > UPDATED_AT_MS:
+            return {'total': 0, 'results': []}
+        return contacts_page(int(body.get('after', 0)), int(body.get('limit', 100)))
+
+    @app.post('/crm/v3/objects/contacts')
+    async def hubspot_create(request: Request):
+        body = await request.json()
+        return JSONResponse(
+            {'id': str(total + random.randint(1, 10 ** 6)), 'properties': body.get('properties', {})},
+            status_code=201,
+        )
+
+    @app.get('/crm/v3/objects/contacts/{contact_id}')
+    async def hubspot_get(contact_id: str):
+        if not contact_id.isdigit() or int(contact_id) >= total:
+            return JSONResponse({'message': 'Object not found'}, status_code=404)
+        return contact(int(contact_id))
+
+    @app.patch('/crm/v3/objects/contacts/{contact_id}')
+    async def hubspot_update(contact_id: str, request: Request):
+        body = await request.json()
+        return {'id': contact_id, 'properties': body.get('properties', {})}
+
+    @app.delete('/crm/v3/objects/contacts/{contact_id}')
+    async def hubspot_delete(contact_id: str):
+        return Response(status_code=204)
+
+    @app.post('/crm/v3/objects/contacts/batch/{action}')
+    async def hubspot_batch(action: str, request: Request):
+        body = await request.json()
+        if action == 'archive':
+            return Response(status_code=204)
+        return {'status': 'COMPLETE', 'results': [
+            {'id': record.get('id', str(total + n)), 'properties': record.get('properties', {})}
+            for n, record in enumerate(body.get('inputs', []))
+        ]}
+
+    # Airtable
+
+    @app.post('/oauth2/v1/token')
+    async def airtable_token():
+        return tokens()
+
+    @app.get('/v0/meta/bases')
+    async def airtable_bases(offset: int = 0):
+        bases = [
+            {'id': f'app{i}', 'name': f'Base {i}', 'permissionLevel': 'create'}
+            for i in range(offset, min(offset + page_size, total))
+        ]
+        page = {'bases': bases}
+        if offset + page_size < total:
+            page['offset'] = str(offset + page_size)
+        return page
+
+    @app.get('/v0/meta/bases/{base_id}/tables')
+    async def airtable_tables(base_id: str):
+        return {'tables': [
+            {'id': f'{base_id}tbl{j}', 'name': f'Table {j}', 'primaryFieldId': 'fld0',
+             'description': filler, 'fields': [{'id': 'fld0', 'name': 'Name', 'type': 'singleLineText'}]}
+            for j in range(3)
+        ]}
+
+    # Notion
+
+    @app.post('/v1/oauth/token')
+    async def notion_token():
+        return {**tokens(), 'workspace_id': 'bench-workspace', 'bot_id': 'bench-bot'}
+
+    @app.post('/v1/search')
+    async def notion_search(request: Request):
+        body = await request.json()
+        start = int(body.get('start_cursor') or 0)
+        size = int(body.get('page_size', 100))
+        results = [
+            {
+                'object': 'page',
+                'id': f'page-{i}',
+                'created_time': CREATED_AT,
+                'last_edited_time': UPDATED_AT,
+                'parent': {'type': 'workspace', 'workspace': True},
+                'archived': False,
+                'properties': {
+                    'Notes': {'id': 'n', 'type': 'rich_text', 'rich_text': [
+                        {'type': 'text', 'text': {'content': filler, 'link': None}, 'plain_text': filler}
+                    ]},
+                    'Name': {'id': 'title', 'type': 'title', 'title': [
+                        {'type': 'text', 'text': {'content': f'Page {i}', 'link': None}, 'plain_text': f'Page {i}'}
+                    ]},
+                },
+            }
+            for i in range(start, min(start + size, total))
+        ]
+        has_more = start + size < total
+        return {'object': 'list', 'results': results, 'has_more': has_more,
+                'next_cursor': str(start + size) if has_more else None}
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8900)
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--pages', type=int, default=5)
+    parser.add_argument('--page-size', type=int, default=100)
+    parser.add_argument('--payload-bytes', type=int, default=0)
+    parser.add_argument('--rate-429', type=float, default=0.0)
+    parser.add_argument('--retry-after', type=float, default=0)
+    args = parser.parse_args()
+
+    app = create_app(
+        latency_ms=args.latency_ms,
+        jitter_ms=args.jitter_ms,
+        pages=args.pages,
+        page_size=args.page_size,
+        payload_bytes=args.payload_bytes,
+        rate_429=args.rate_429,
+        retry_after=args.retry_after,
+    )
+    uvicorn.run(app, host=args.host, port=args.port, log_level='warning')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,10 @@
+import hashlib
+from typing import Optional
+
+
+def token_fingerprint(token: Optional[str]) -> str:
+    """
+    A short, stable stand-in for a provider token, for cache keys and scopes,
+    so the raw token is never kept in Redis or in memory as a key.
+    """
+    return hashlib.sha256((token or "").encode("utf-8")).hexdigest()[:16]
@@ -0,0 +1,53 @@
+import os
+from typing import Dict
+
+import httpx
+
+# Shared, pooled HTTP clients (one per provider) so every upstream call reuses
+# warm TCP/TLS connections instead of paying a new handshake each time.
+PROVIDERS = ("hubspot", "airtable", "notion")
+
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "true").lower() in ("1", "true", "yes")
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", "100"))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", "20"))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", "30"))
+HTTP_TIMEOUT = float(os.getenv("HTTP_TIMEOUT", "30"))
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", "10"))
+
+_clients: Dict[str, httpx.AsyncClient] = {}
+
+
+def _build_client() -> httpx.AsyncClient:
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    timeout = httpx.Timeout(HTTP_TIMEOUT, connect=HTTP_CONNECT_TIMEOUT)
+    return httpx.AsyncClient(http2=HTTP2_ENABLED, limits=limits, timeout=timeout)
+
+
+def get_http_client(provider: str) -> httpx.AsyncClient:
+    """
+    Return the shared client for `provider`.
+    Created lazily so the integrations also work outside the app lifespan.
+    """
+    client = _clients.get(provider)
+    if client is None or client.is_closed:
+        client = _build_client()
+        _clients[provider] = client
+    return client
+
+
+async def init_http_clients():
+    """Create one pooled client per provider (called on app startup)."""
+    for provider in PROVIDERS:
+        get_http_client(provider)
+
+
+async def close_http_clients():
+    """Close every shared client (called on app shutdown)."""
+    clients = list(_clients.values())
+    _clients.clear()
+    for client in clients:
+        await client.aclose()
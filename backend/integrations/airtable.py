@@ -2,18 +2,32 @@
 
 import datetime
 import json
+import logging
+import os
+import time
 import secrets
 from fastapi import Request, HTTPException
 from fastapi.responses import HTMLResponse
-import httpx
 import asyncio
 import base64
 import hashlib
 
-import requests
+from fingerprint import token_fingerprint
 from integrations.integration_item import IntegrationItem
+from integrations.pagination import paginate, airtable_offset
+from rate_limiter import send_request, raise_for_rate_limit, record_failure
+from log import log_event, log_sampled
+from metrics import CACHE_LOOKUPS
+from tracing import tag_request
 
-from redis_client import add_key_value_redis, get_value_redis, delete_key_redis
+from redis_client import (
+    add_key_value_redis,
+    add_key_values_redis,
+    get_value_redis,
+    delete_keys_redis,
+    consume_key_redis,
+    consume_keys_redis,
+)
 
 # CLIENT_ID = 'XXX'
 # CLIENT_SECRET = 'XXX'
@@ -23,9 +37,29 @@ REDIRECT_URI = 'http://localhost:8000/integrations/airtable/oauth2callback'
 authorization_url = f'https://airtable.com/oauth2/v1/authorize?client_id={CLIENT_ID}&response_type=code&owner=user&redirect_uri=http%3A%2F%2Flocalhost%3A8000%2Fintegrations%2Fairtable%2Foauth2callback'
 
 encoded_client_id_secret = base64.b64encode(f'{CLIENT_ID}:{CLIENT_SECRET}'.encode()).decode()
+# Overridable so the offline benchmarks can point at a local mock server
+API_BASE = os.getenv('AIRTABLE_API_BASE', 'https://api.airtable.com')
+TOKEN_URL = os.getenv('AIRTABLE_TOKEN_URL', 'https://airtable.com/oauth2/v1/token')
+
 scope = 'data.records:read data.records:write data.recordComments:read data.recordComments:write schema.bases:read schema.bases:write'
 
+# Airtable allows 50 req/s per access token, so keep the table fan-out well below that
+MAX_CONCURRENT_TABLE_FETCHES = int(os.getenv('AIRTABLE_MAX_CONCURRENCY', '5'))
+
+# Base and table schemas rarely change: they're served from Redis, fresh for
+# AIRTABLE_META_TTL seconds, then for up to AIRTABLE_META_STALE_TTL more while
+# a background refresh brings them up to date (stale-while-revalidate)
+AIRTABLE_META_TTL = int(os.getenv('AIRTABLE_META_TTL', '300'))
+AIRTABLE_META_STALE_TTL = int(os.getenv('AIRTABLE_META_STALE_TTL', '3600'))
+_revalidating = {}
+# Shared by every background table refresh, so a stale cache can't fan out to
+# every base at once. Created on first use, inside the running event loop
+_revalidation_slots = None
+
+logger = logging.getLogger(__name__)
+
 async def authorize_airtable(user_id, org_id):
+    tag_request(org_id=org_id, user_id=user_id)
     state_data = {
         'state': secrets.token_urlsafe(32),
         'user_id': user_id,
@@ -39,9 +73,12 @@ async def authorize_airtable(user_id, org_id):
     code_challenge = base64.urlsafe_b64encode(m.digest()).decode('utf-8').replace('=', '')
 
     auth_url = f'{authorization_url}&state={encoded_state}&code_challenge={code_challenge}&code_challenge_method=S256&scope={scope}'
-    await asyncio.gather(
-        add_key_value_redis(f'airtable_state:{org_id}:{user_id}', json.dumps(state_data), expire=600),
-        add_key_value_redis(f'airtable_verifier:{org_id}:{user_id}', code_verifier, expire=600),
+    await add_key_values_redis(
+        {
+            f'airtable_state:{org_id}:{user_id}': json.dumps(state_data),
+            f'airtable_verifier:{org_id}:{user_id}': code_verifier,
+        },
+        expire=600,
     )
 
     return auth_url
@@ -56,34 +93,34 @@ async def oauth2callback_airtable(request: Request):
     original_state = state_data.get('state')
     user_id = state_data.get('user_id')
     org_id = state_data.get('org_id')
+    tag_request(org_id=org_id, user_id=user_id)
 
-    saved_state, code_verifier = await asyncio.gather(
-        get_value_redis(f'airtable_state:{org_id}:{user_id}'),
-        get_value_redis(f'airtable_verifier:{org_id}:{user_id}'),
+    # State and verifier are single-use: read and delete both in one round trip
+    saved_state, code_verifier = await consume_keys_redis(
+        f'airtable_state:{org_id}:{user_id}',
+        f'airtable_verifier:{org_id}:{user_id}',
     )
 
     if not saved_state or original_state != json.loads(saved_state).get('state'):
         raise HTTPException(status_code=400, detail='State does not match.')
 
-    async with httpx.AsyncClient() as client:
-        response, _, _ = await asyncio.gather(
-            client.post(
-                'https://airtable.com/oauth2/v1/token',
-                data={
-                    'grant_type': 'authorization_code',
-                    'code': code,
-                    'redirect_uri': REDIRECT_URI,
-                    'client_id': CLIENT_ID,
-                    'code_verifier': code_verifier.decode('utf-8'),
-                },
-                headers={
-                    'Authorization': f'Basic {encoded_client_id_secret}',
-                    'Content-Type': 'application/x-www-form-urlencoded',
-                }
-            ),
-            delete_key_redis(f'airtable_state:{org_id}:{user_id}'),
-            delete_key_redis(f'airtable_verifier:{org_id}:{user_id}'),
-        )
+    response = await send_request(
+        'airtable',
+        'POST',
+        TOKEN_URL,
+        limit_key=CLIENT_ID,
+        data={
+            'grant_type': 'authorization_code',
+            'code': code,
+            'redirect_uri': REDIRECT_URI,
+            'client_id': CLIENT_ID,
+            'code_verifier': code_verifier.decode('utf-8'),
+        },
+        headers={
+            'Authorization': f'Basic {encoded_client_id_secret}',
+            'Content-Type': 'application/x-www-form-urlencoded',
+        }
+    )
 
     await add_key_value_redis(f'airtable_credentials:{org_id}:{user_id}', json.dumps(response.json()), expire=600)
     
@@ -97,11 +134,11 @@ async def oauth2callback_airtable(request: Request):
     return HTMLResponse(content=close_window_script)
 
 async def get_airtable_credentials(user_id, org_id):
-    credentials = await get_value_redis(f'airtable_credentials:{org_id}:{user_id}')
+    tag_request(org_id=org_id, user_id=user_id)
+    credentials = await consume_key_redis(f'airtable_credentials:{org_id}:{user_id}')
     if not credentials:
         raise HTTPException(status_code=400, detail='No credentials found.')
     credentials = json.loads(credentials)
-    await delete_key_redis(f'airtable_credentials:{org_id}:{user_id}')
 
     return credentials
 
@@ -120,53 +157,218 @@ def create_integration_item_metadata_object(
     return integration_item_metadata
 
 
-def fetch_items(
-    access_token: str, url: str, aggregated_response: list, offset=None
-) -> dict:
-    """Fetching the list of bases"""
-    params = {'offset': offset} if offset is not None else {}
+async def iter_bases(access_token: str, url: str):
+    """Yielding the list of bases page by page"""
     headers = {'Authorization': f'Bearer {access_token}'}
-    response = requests.get(url, headers=headers, params=params)
 
-    if response.status_code == 200:
-        results = response.json().get('bases', {})
-        offset = response.json().get('offset', None)
+    async def fetch_page(offset):
+        params = {'offset': offset} if offset is not None else {}
+        response = await send_request(
+            'airtable', 'GET', url, limit_key=access_token, headers=headers, params=params
+        )
+        raise_for_rate_limit(response, 'Airtable')
+        if response.status_code != 200:
+            # A silently truncated base list would end up in the metadata cache
+            raise HTTPException(status_code=400, detail='Failed to fetch Airtable bases.')
+        return response.json()
 
-        for item in results:
-            aggregated_response.append(item)
+    # The next page is already in flight while this one is handled: cancel it if we stop early
+    pages = paginate(fetch_page, lambda page: page.get('bases', []), airtable_offset)
+    try:
+        async for bases in pages:
+            yield bases
+    finally:
+        await pages.aclose()
 
-        if offset is not None:
-            fetch_items(access_token, url, aggregated_response, offset)
-        else:
-            return
 
+def _meta_key(access_token: str, name: str) -> str:
+    return f'airtable_meta:{token_fingerprint(access_token)}:{name}'
 
-async def get_items_airtable(credentials) -> list[IntegrationItem]:
-    credentials = json.loads(credentials)
-    url = 'https://api.airtable.com/v0/meta/bases'
-    list_of_integration_item_metadata = []
-    list_of_responses = []
-
-    fetch_items(credentials.get('access_token'), url, list_of_responses)
-    for response in list_of_responses:
-        list_of_integration_item_metadata.append(
-            create_integration_item_metadata_object(response, 'Base')
+
+async def _read_meta(key: str):
+    cached = await get_value_redis(key)
+    return json.loads(cached) if cached else None
+
+
+async def _write_meta(key: str, data, etag=None):
+    entry = {'fetched_at': time.time(), 'etag': etag, 'data': data}
+    await add_key_value_redis(key, json.dumps(entry), expire=AIRTABLE_META_TTL + AIRTABLE_META_STALE_TTL)
+
+
+def _is_fresh(entry: dict) -> bool:
+    return time.time() - entry['fetched_at'] < AIRTABLE_META_TTL
+
+
+def _revalidate_in_background(key: str, refresh):
+    """Run `refresh()` once per key at a time, without making the caller wait."""
+    if key in _revalidating:
+        return
+    task = asyncio.ensure_future(refresh())
+    _revalidating[key] = task
+
+    def done(task):
+        _revalidating.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            # Keep serving the stale entry, the next stale read retries
+            log_event(logger, logging.WARNING, 'Airtable metadata revalidation failed',
+                      key=key, error=repr(task.exception()))
+
+    task.add_done_callback(done)
+
+
+async def _iter_and_cache_bases(access_token: str, url: str):
+    """iter_bases, storing the full list once the last page has been read"""
+    all_bases = []
+    pages = iter_bases(access_token, url)
+    try:
+        async for bases in pages:
+            all_bases.extend(bases)
+            yield bases
+    finally:
+        await pages.aclose()
+    await _write_meta(_meta_key(access_token, 'bases'), all_bases)
+
+
+async def _refresh_bases(access_token: str, url: str):
+    async for _ in _iter_and_cache_bases(access_token, url):
+        pass
+
+
+async def _cached_bases(bases: list):
+    yield bases
+
+
+async def _refresh_tables(access_token: str, base_id: str, semaphore=None, cached=None) -> list:
+    """Fetch a base's tables and cache them, revalidating with If-None-Match when we have an ETag"""
+    headers = {'Authorization': f'Bearer {access_token}'}
+    if cached and cached.get('etag'):
+        headers['If-None-Match'] = cached['etag']
+
+    def send():
+        return send_request(
+            'airtable',
+            'GET',
+            f'{API_BASE}/v0/meta/bases/{base_id}/tables',
+            limit_key=access_token,
+            # Airtable's limit is per base, so each base gets its own bucket
+            scope=base_id,
+            headers=headers,
         )
-        tables_response = requests.get(
-            f'https://api.airtable.com/v0/meta/bases/{response.get("id")}/tables',
-            headers={'Authorization': f'Bearer {credentials.get("access_token")}'},
+
+    if semaphore is None:
+        response = await send()
+    else:
+        async with semaphore:
+            response = await send()
+    raise_for_rate_limit(response, 'Airtable')
+
+    key = _meta_key(access_token, f'tables:{base_id}')
+    if response.status_code == 304 and cached is not None:
+        await _write_meta(key, cached['data'], cached.get('etag'))
+        return cached['data']
+    if response.status_code == 200:
+        tables = response.json().get('tables', [])
+        await _write_meta(key, tables, response.headers.get('ETag'))
+        return tables
+    # Failures aren't cached; a stale entry beats nothing, but don't hide them
+    record_failure('airtable')
+    log_event(logger, logging.WARNING, 'Failed to fetch Airtable tables',
+              base_id=base_id, status=response.status_code, serving_stale=cached is not None)
+    return cached['data'] if cached else []
+
+
+def _revalidation_semaphore() -> asyncio.Semaphore:
+    global _revalidation_slots
+    if _revalidation_slots is None:
+        _revalidation_slots = asyncio.Semaphore(MAX_CONCURRENT_TABLE_FETCHES)
+    return _revalidation_slots
+
+
+async def fetch_tables(access_token: str, base_id: str, semaphore: asyncio.Semaphore) -> list:
+    """Fetching the list of tables for a single base, from the metadata cache when possible"""
+    key = _meta_key(access_token, f'tables:{base_id}')
+    cached = await _read_meta(key)
+    if cached is None:
+        CACHE_LOOKUPS.labels('airtable_tables', 'miss').inc()
+        return await _refresh_tables(access_token, base_id, semaphore)
+    if _is_fresh(cached):
+        CACHE_LOOKUPS.labels('airtable_tables', 'hit').inc()
+    else:
+        CACHE_LOOKUPS.labels('airtable_tables', 'stale').inc()
+        _revalidate_in_background(
+            key, lambda: _refresh_tables(access_token, base_id, _revalidation_semaphore(), cached=cached)
         )
-        if tables_response.status_code == 200:
-            tables_response = tables_response.json()
-            for table in tables_response['tables']:
-                list_of_integration_item_metadata.append(
-                    create_integration_item_metadata_object(
+    return cached['data']
+
+
+async def iter_items_airtable(credentials):
+    """Yields IntegrationItems as each page of bases (and their tables) is parsed"""
+    credentials = json.loads(credentials)
+    access_token = credentials.get('access_token')
+    url = f'{API_BASE}/v0/meta/bases'
+
+    bases_key = _meta_key(access_token, 'bases')
+    cached = await _read_meta(bases_key)
+    if cached is None:
+        CACHE_LOOKUPS.labels('airtable_bases', 'miss').inc()
+        pages = _iter_and_cache_bases(access_token, url)
+    else:
+        if _is_fresh(cached):
+            CACHE_LOOKUPS.labels('airtable_bases', 'hit').inc()
+        else:
+            CACHE_LOOKUPS.labels('airtable_bases', 'stale').inc()
+            _revalidate_in_background(bases_key, lambda: _refresh_bases(access_token, url))
+        pages = _cached_bases(cached['data'])
+
+    semaphore = asyncio.Semaphore(MAX_CONCURRENT_TABLE_FETCHES)
+    pending = []
+    try:
+        async for bases in pages:
+            # Table lookups for the whole page start at once, while the next
+            # page of bases is still being fetched
+            pending = [
+                asyncio.ensure_future(fetch_tables(access_token, base.get('id'), semaphore))
+                for base in bases
+            ]
+            for base, tables_task in zip(bases, pending):
+                yield create_integration_item_metadata_object(base, 'Base')
+                for table in await tables_task:
+                    yield create_integration_item_metadata_object(
                         table,
                         'Table',
-                        response.get('id', None),
-                        response.get('name', None),
+                        base.get('id', None),
+                        base.get('name', None),
                     )
-                )
+    finally:
+        for task in pending:
+            task.cancel()
+        await pages.aclose()
+
+
+async def invalidate_airtable_metadata(credentials, base_id=None) -> dict:
+    """
+    Drop cached schema metadata for these credentials: one base's tables when
+    `base_id` is given, otherwise the base list and every cached base's tables.
+    """
+    credentials = json.loads(credentials)
+    access_token = credentials.get('access_token')
+    if base_id:
+        keys = [_meta_key(access_token, f'tables:{base_id}')]
+    else:
+        bases_key = _meta_key(access_token, 'bases')
+        cached = await _read_meta(bases_key)
+        keys = [bases_key] + [
+            _meta_key(access_token, f'tables:{base.get("id")}') for base in (cached or {}).get('data', [])
+        ]
+    await delete_keys_redis(*keys)
+    return {'invalidated': len(keys)}
+
+
+async def get_items_airtable(credentials) -> list[IntegrationItem]:
+    list_of_integration_item_metadata = [
+        item async for item in iter_items_airtable(credentials)
+    ]
 
-    print(f'list_of_integration_item_metadata: {list_of_integration_item_metadata}')
+    # Just the count, and only for a sample of loads: never the items themselves
+    log_sampled(logger, logging.INFO, 'Loaded Airtable items', count=len(list_of_integration_item_metadata))
     return list_of_integration_item_metadata
@@ -1,35 +1,115 @@
 import os
 import json
+import logging
 import secrets
+import asyncio
 from dotenv import load_dotenv
 from fastapi import Request, HTTPException
 from fastapi.responses import HTMLResponse
-import httpx
+from redis.exceptions import LockError
 import time
-from typing import Optional, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 from integrations.integration_item import IntegrationItem
-from redis_client import add_key_value_redis, get_value_redis, delete_key_redis
+from integrations.pagination import paginate, hubspot_after
+from integrations.sync_state import (
+    advance_watermark,
+    commit_snapshot,
+    discard_staging,
+    get_sync_watermark,
+    iso_to_millis,
+    iter_snapshot,
+    merge_snapshot_records,
+    new_staging_key,
+    remove_snapshot_records,
+    stage_snapshot_records,
+    sync_since,
+)
+from rate_limiter import send_request, raise_for_rate_limit
+from local_cache import LRUCache
+from log import log_event
+from metrics import TOKEN_REFRESHES, TOKEN_REFRESH_DURATION, register_local_cache
+from tracing import span, tag_request
+from redis_client import (
+    add_key_value_redis,
+    get_value_redis,
+    consume_key_redis,
+    redis_pipeline,
+    redis_lock,
+    pubsub_redis,
+    add_to_sorted_set_redis,
+)
 
 # Load the .env file
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 # Best to read secrets from env files, A good practice which I have learnt! :)
 CLIENT_ID = os.getenv("HUBSPOT_CLIENT_ID")
 CLIENT_SECRET = os.getenv("HUBSPOT_CLIENT_SECRET")
 REDIRECT_URI = os.getenv('HUBSPOT_REDIRECT_URI', 'http://localhost:8000/integrations/hubspot/oauth2callback')
 
 AUTHORIZATION_URL = "https://app.hubspot.com/oauth/authorize"
-TOKEN_URL = "https://api.hubapi.com/oauth/v1/token"
+# Overridable so the offline benchmarks can point at a local mock server
+API_BASE = os.getenv("HUBSPOT_API_BASE", "https://api.hubapi.com")
+TOKEN_URL = f"{API_BASE}/oauth/v1/token"
 SCOPES = "crm.objects.contacts.read crm.objects.contacts.write oauth"
 
-BASE_URL = "https://api.hubapi.com/crm/v3/objects/contacts"
+BASE_URL = f"{API_BASE}/crm/v3/objects/contacts"
+SEARCH_URL = f"{BASE_URL}/search"
+# HubSpot caps the list endpoint at 100 records per page
+CONTACTS_PAGE_LIMIT = 100
+# The search API can't page past its first 10,000 results
+SEARCH_RESULT_CAP = 10000
+# What the list endpoint returns by default, asked for explicitly from search
+SEARCH_PROPERTIES = ["firstname", "lastname", "email", "createdate", "lastmodifieddate"]
+# HubSpot batch endpoints accept at most 100 records per call
+BATCH_SIZE = 100
+# Batch chunks sent to HubSpot at once, per request
+BATCH_CONCURRENCY = int(os.getenv("HUBSPOT_BATCH_CONCURRENCY", "4"))
+
+# Contacts seen in a recent list/batch read, so delete_contact can skip its
+# existence check. Kept short-lived: HubSpot answers DELETE with 204 either way.
+CONTACT_EXISTS_TTL = float(os.getenv("HUBSPOT_CONTACT_EXISTS_TTL", "30"))
+_known_contacts = LRUCache(int(os.getenv("HUBSPOT_CONTACT_EXISTS_CACHE_SIZE", "10000")))
+register_local_cache("hubspot_known_contacts", _known_contacts)
+
+# Refresh a token this many seconds before it actually expires
+REFRESH_SKEW_SECONDS = 30
+# Only one worker across the fleet refreshes a given org/user at a time
+REFRESH_LOCK_TIMEOUT = float(os.getenv("HUBSPOT_REFRESH_LOCK_TIMEOUT", "30"))
+REFRESH_LOCK_WAIT = float(os.getenv("HUBSPOT_REFRESH_LOCK_WAIT", "15"))
+
+# In-process single-flight: concurrent refreshes for one org/user share a task
+_refreshes_in_flight: Dict[Tuple[str, str], asyncio.Future] = {}
+
+# L1 cache of parsed credentials in front of Redis, evicted before the token
+# needs a refresh and invalidated whenever new tokens are stored
+CREDENTIALS_CACHE_SIZE = int(os.getenv("CREDENTIALS_CACHE_SIZE", "10000"))
+CREDENTIALS_CACHE_MAX_TTL = float(os.getenv("CREDENTIALS_CACHE_MAX_TTL", "300"))
+CREDENTIALS_INVALIDATION_CHANNEL = "hubspot_credentials:invalidate"
+_credentials_cache = LRUCache(CREDENTIALS_CACHE_SIZE)
+register_local_cache("hubspot_credentials", _credentials_cache)
+# Lets a worker ignore its own invalidation messages
+_INSTANCE_ID = secrets.token_hex(8)
+
+# Sorted set of "{org_id}:{user_id}" scored by expires_at_utc, scanned by the
+# background refresher (see hubspot_refresher.py)
+CREDENTIALS_EXPIRY_INDEX = "hubspot_credentials_expiry"
+# Same members scored by when they last used their token. The refresher only
+# keeps tokens of recently active users alive; idle ones expire as before.
+CREDENTIALS_ACTIVITY_INDEX = "hubspot_credentials_activity"
+# Activity is written at most once per this many seconds per user and worker
+ACTIVITY_RESOLUTION = float(os.getenv("HUBSPOT_ACTIVITY_RESOLUTION", "60"))
+_recently_marked_active = LRUCache(CREDENTIALS_CACHE_SIZE)
 
 async def authorize_hubspot(user_id: str, org_id: str) -> str:
     """
     Generate and return the HubSpot authorization URL.
     Stores 'state' in Redis to correlate the callback.
     """
+    tag_request(org_id=org_id, user_id=user_id)
     state = secrets.token_urlsafe(32)
     state_data = {
         "state": state,
@@ -66,18 +146,15 @@ async def oauth2callback_hubspot(request: Request):
     if not state:
         raise HTTPException(status_code=400, detail="Missing state parameter.")
 
-    saved_state = await get_value_redis(f"hubspot_state:{state}")
+    # The state key is single-use: read and delete it in one round trip (GETDEL)
+    saved_state = await consume_key_redis(f"hubspot_state:{state}")
     if not saved_state:
         raise HTTPException(status_code=400, detail="Invalid or expired state token.")
 
-    # Cleaning up the state key (it's single-use), why not use a TTL? :(
-    # Could have implemented by passing parameter 'expire' in 'add_key_value_redis'
-    # But, I wanted to use 'delete_key_redis' as well! :)
-    await delete_key_redis(f"hubspot_state:{state}")
-
     state_data = json.loads(saved_state)
     user_id = state_data["user_id"]
     org_id = state_data["org_id"]
+    tag_request(org_id=org_id, user_id=user_id)
 
     # Exchange code for tokens
     token_data = {
@@ -93,17 +170,23 @@ async def oauth2callback_hubspot(request: Request):
         raise HTTPException(status_code=400, detail="Failed to exchange code for access token.")
 
     # Save tokens in Redis
-    await store_tokens_in_redis(org_id, user_id, tokens)
+    await store_tokens_in_redis(org_id, user_id, tokens, login=True)
 
     # Return a script that closes the popup
     return HTMLResponse("<script>window.close()</script>", status_code=200)
 
-async def get_hubspot_credentials(user_id: str, org_id: str) -> dict:
+async def get_hubspot_credentials(user_id: str, org_id: str, use_cache: bool = True) -> dict:
     """
-    Fetch stored tokens from Redis if they exist.
+    Fetch stored tokens from the in-process cache or Redis if they exist.
     Raise HTTPException(400) if missing.
     """
+    tag_request(org_id=org_id, user_id=user_id)
     key = f"hubspot_credentials:{org_id}:{user_id}"
+    if use_cache:
+        cached = _credentials_cache.get(key)
+        if cached is not None:
+            return cached
+
     stored = await get_value_redis(key)
     if not stored:
         # Here user needs to login again, as we don't have any stored tokens
@@ -112,7 +195,57 @@ async def get_hubspot_credentials(user_id: str, org_id: str) -> dict:
             status_code=400,
             detail=f"No HubSpot credentials found for org={org_id}, user={user_id}.\nPlease refresh and Login again."
         )
-    return json.loads(stored)
+    credentials = json.loads(stored)
+    _cache_credentials(key, credentials)
+    return credentials
+
+def _cache_credentials(key: str, credentials: dict):
+    """
+    Keep credentials in the L1 cache until shortly before the token needs a
+    refresh (so the refresh path always sees Redis), capped at CREDENTIALS_CACHE_MAX_TTL.
+    """
+    expires_at = credentials.get("expires_at_utc")
+    if not expires_at:
+        return
+    _credentials_cache.set(
+        key,
+        credentials,
+        min(expires_at - REFRESH_SKEW_SECONDS, time.time() + CREDENTIALS_CACHE_MAX_TTL),
+    )
+
+async def listen_for_credential_invalidations():
+    """
+    Evict credentials that other workers have re-stored, keeping every
+    worker's L1 cache coherent. Runs for the lifetime of the app.
+    """
+    while True:
+        pubsub = pubsub_redis()
+        try:
+            await pubsub.subscribe(CREDENTIALS_INVALIDATION_CHANNEL)
+            async for message in pubsub.listen():
+                sender, _, key = message["data"].decode("utf-8").partition("|")
+                if sender != _INSTANCE_ID:
+                    _credentials_cache.invalidate(key)
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            # Invalidations may have been missed while disconnected, so start clean
+            _credentials_cache.clear()
+            await asyncio.sleep(1)
+        finally:
+            await pubsub.aclose()
+
+async def mark_active(org_id: str, user_id: str):
+    """
+    Record that org/user is using HubSpot, so the background refresher keeps
+    their token fresh. Throttled per worker to one write per ACTIVITY_RESOLUTION.
+    """
+    member = f"{org_id}:{user_id}"
+    if _recently_marked_active.get(member) is not None:
+        return
+    now = time.time()
+    _recently_marked_active.set(member, True, now + ACTIVITY_RESOLUTION)
+    await add_to_sorted_set_redis(CREDENTIALS_ACTIVITY_INDEX, {member: int(now)})
 
 async def get_valid_hubspot_access_token(org_id: str, user_id: str) -> str:
     """
@@ -122,32 +255,103 @@ async def get_valid_hubspot_access_token(org_id: str, user_id: str) -> str:
     """
     # Loading stored tokens
     credentials = await get_hubspot_credentials(user_id, org_id)
+    await mark_active(org_id, user_id)
     access_token = credentials.get("access_token")
     refresh_token = credentials.get("refresh_token")
 
     # We also stored custom 'expires_at' time in func 'store_tokens_in_redis'
     # if you remember! :)
-    expires_at = credentials.get("expires_at_utc")
-    if not expires_at:
-        # If we have no expires_at then a fallback to just returning the token.
-        return await refresh_access_token(org_id, user_id, refresh_token)
-
-    now_utc = int(time.time())
     # If the token expires in next ~30 seconds, refresh it!
     # Isn't this cool? We can refresh the token before it expires! :)
-    if now_utc > (expires_at - 30):
+    if token_needs_refresh(credentials):
         return await refresh_access_token(org_id, user_id, refresh_token)
 
     # Otherwise, it's still good
     return access_token
 
-async def refresh_access_token(org_id: str, user_id: str, refresh_token: str) -> str:
+def token_needs_refresh(credentials: dict, min_validity: int = REFRESH_SKEW_SECONDS) -> bool:
+    """
+    True if the stored token has no expiry info or expires within `min_validity` seconds.
+    """
+    expires_at = credentials.get("expires_at_utc")
+    if not expires_at:
+        return True
+    return int(time.time()) > (expires_at - min_validity)
+
+async def refresh_access_token(
+    org_id: str,
+    user_id: str,
+    refresh_token: str,
+    min_validity: int = REFRESH_SKEW_SECONDS,
+) -> str:
     """
     Use the stored refresh_token to get a new access_token from HubSpot.
     Store the new tokens in Redis. Return the new access_token.
+
+    Concurrent callers for the same org/user in this process share one refresh,
+    and a Redis lock makes sure only one worker in the fleet talks to HubSpot.
+    The stored token is kept if it is still valid for `min_validity` seconds.
+    """
+    key = (org_id, user_id)
+    in_flight = _refreshes_in_flight.get(key)
+    if in_flight is not None:
+        TOKEN_REFRESHES.labels("deduplicated").inc()
+        return await asyncio.shield(in_flight)
+
+    task = asyncio.ensure_future(_refresh_access_token_locked(org_id, user_id, refresh_token, min_validity))
+    _refreshes_in_flight[key] = task
+    task.add_done_callback(lambda _: _refreshes_in_flight.pop(key, None))
+    # Shielded so one cancelled caller doesn't cancel the refresh for everyone else
+    return await asyncio.shield(task)
+
+async def _refresh_access_token_locked(
+    org_id: str, user_id: str, refresh_token: str, min_validity: int
+) -> str:
+    """
+    Refresh under the fleet-wide Redis lock. Whoever wins the lock re-reads the
+    credentials first: if another worker already refreshed, its token is reused.
+    """
+    lock = redis_lock(
+        f"hubspot_refresh_lock:{org_id}:{user_id}",
+        timeout=REFRESH_LOCK_TIMEOUT,
+        blocking_timeout=REFRESH_LOCK_WAIT,
+    )
+    # Runs in its own task, but the copied context keeps the first caller's span as parent
+    with span("hubspot.refresh_token", org_id=org_id, user_id=user_id) as current:
+        start = time.perf_counter()
+        acquired = await lock.acquire()
+        current.set_attribute("lock_acquired", acquired)
+        try:
+            credentials = await get_hubspot_credentials(user_id, org_id, use_cache=False)
+            if not token_needs_refresh(credentials, min_validity):
+                TOKEN_REFRESHES.labels("deduplicated").inc()
+                current.set_attribute("outcome", "deduplicated")
+                return credentials["access_token"]
+            if not acquired:
+                raise HTTPException(
+                    status_code=503,
+                    detail="HubSpot token refresh is already in progress, please retry."
+                )
+            # The stored refresh_token may have been rotated since the caller read it
+            return await _exchange_refresh_token(
+                org_id, user_id, credentials.get("refresh_token") or refresh_token
+            )
+        finally:
+            if acquired:
+                try:
+                    await lock.release()
+                except LockError:
+                    # The lock already expired on its own, nothing left to release
+                    pass
+            TOKEN_REFRESH_DURATION.observe(time.perf_counter() - start)
+
+async def _exchange_refresh_token(org_id: str, user_id: str, refresh_token: str) -> str:
+    """
+    Exchange the refresh_token with HubSpot and store the new tokens.
     """
-    print(f"[REFRESH] Attempting to refresh token for org={org_id}, user={user_id}")
+    log_event(logger, logging.INFO, "Refreshing HubSpot token", org_id=org_id, user_id=user_id)
     if not refresh_token:
+        TOKEN_REFRESHES.labels("failed").inc()
         raise HTTPException(
             status_code=400,
             detail="No refresh_token available to refresh access token."
@@ -162,6 +366,7 @@ async def refresh_access_token(org_id: str, user_id: str, refresh_token: str) ->
 
     new_tokens = await hubspot_exchange_for_tokens(token_data)
     if not new_tokens:
+        TOKEN_REFRESHES.labels("failed").inc()
         raise HTTPException(
             status_code=400,
             detail="Failed to refresh HubSpot access token."
@@ -169,6 +374,7 @@ async def refresh_access_token(org_id: str, user_id: str, refresh_token: str) ->
 
     # Store updated tokens
     await store_tokens_in_redis(org_id, user_id, new_tokens)
+    TOKEN_REFRESHES.labels("refreshed").inc()
 
     return new_tokens["access_token"]
 
@@ -177,23 +383,25 @@ async def hubspot_exchange_for_tokens(token_data: dict) -> dict:
     Helper function to call HubSpotfor both 'authorization_code' and 'refresh_token' flows.
     Returns the JSON token payload, or None if error.
     """
-    async with httpx.AsyncClient() as client:
-        resp = await client.post(
-            TOKEN_URL,
-            data=token_data,
-            headers={"Content-Type": "application/x-www-form-urlencoded"}
-        )
-        if resp.status_code != 200:
-            return None
-        return resp.json()
+    resp = await send_request(
+        "hubspot",
+        "POST",
+        TOKEN_URL,
+        limit_key=CLIENT_ID,
+        data=token_data,
+        headers={"Content-Type": "application/x-www-form-urlencoded"}
+    )
+    if resp.status_code != 200:
+        return None
+    return resp.json()
 
-async def store_tokens_in_redis(org_id: str, user_id: str, tokens: dict):
+async def store_tokens_in_redis(org_id: str, user_id: str, tokens: dict, login: bool = False):
     """
     Store 'access_token', 'refresh_token', 'expires_in' from HubSpot
     in Redis and a custom 'expires_at_utc' for easy checking.
+    A `login` also counts as activity for the background refresher.
     """
-    expires_in = tokens.get("expires_in", 600)  # fallback 10 mins if missing
-    expires_in = 60  # Forcing a super short TTL for testing the automatic silent refresh in BG
+    expires_in = int(tokens.get("expires_in", 600))  # fallback 10 mins if missing
 
     now_utc = int(time.time())
     expires_at_utc = now_utc + expires_in
@@ -208,8 +416,19 @@ async def store_tokens_in_redis(org_id: str, user_id: str, tokens: dict):
     }
 
     key = f"hubspot_credentials:{org_id}:{user_id}"
-    await add_key_value_redis(key, json.dumps(new_payload), expire=expires_in + 120)
-    # We set Redis key to expire a bit after the token actually expires
+    # Store, index for the background refresher and tell the other workers to
+    # drop their cached copy, all in one round trip
+    async with redis_pipeline() as pipe:
+        # We set Redis key to expire a bit after the token actually expires
+        pipe.set(key, json.dumps(new_payload), ex=expires_in + 120)
+        pipe.zadd(CREDENTIALS_EXPIRY_INDEX, {f"{org_id}:{user_id}": expires_at_utc})
+        if login:
+            pipe.zadd(CREDENTIALS_ACTIVITY_INDEX, {f"{org_id}:{user_id}": now_utc})
+        pipe.publish(CREDENTIALS_INVALIDATION_CHANNEL, f"{_INSTANCE_ID}|{key}")
+        await pipe.execute()
+
+    # Refresh our own L1 entry
+    _cache_credentials(key, new_payload)
 
 async def create_integration_item_metadata_object(
     response_json: dict,
@@ -233,12 +452,11 @@ async def create_integration_item_metadata_object(
         last_modified_time=response_json.get("updatedAt"),
     )
 
-async def get_items_hubspot(credentials_or_str: Union[dict, str]) -> list:
-    """
-    Fetch contacts from HubSpot using the provided credentials.
-    Return a list of IntegrationItem objects.
-    """
+def _sync_scope(org_id: str, user_id: str) -> str:
+    return f"{org_id}:{user_id}"
+
 
+def _parse_load_credentials(credentials_or_str: Union[dict, str]) -> Tuple[str, str]:
     if isinstance(credentials_or_str, str):
         credentials = json.loads(credentials_or_str)
     else:
@@ -252,35 +470,221 @@ async def get_items_hubspot(credentials_or_str: Union[dict, str]) -> list:
             status_code=400,
             detail="Missing 'user_id' or 'org_id' to fetch HubSpot data."
         )
+    tag_request(org_id=org_id, user_id=user_id)
+    return org_id, user_id
+
+
+async def iter_items_hubspot(
+    credentials_or_str: Union[dict, str],
+    max_pages: Optional[int] = None,
+    max_items: Optional[int] = None,
+):
+    """
+    Fetch contacts from HubSpot using the provided credentials.
+    Follows `paging.next.after` until every page is read, or until
+    `max_pages` / `max_items` is reached if the caller set a cap.
+    Yields IntegrationItem objects as each page is converted.
+    An uncapped load also rebuilds the snapshot incremental loads start from.
+    """
+    org_id, user_id = _parse_load_credentials(credentials_or_str)
 
     # First ensure we have valid (non-expired) token
     access_token = await get_valid_hubspot_access_token(org_id, user_id)
 
-    # Then fetch contacts from HubSpot
+    # Then fetch contacts from HubSpot, page by page
     headers = {"Authorization": f"Bearer {access_token}"}
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            BASE_URL,
-            headers=headers
-        )
 
-    if response.status_code != 200:
-        raise HTTPException(
-            status_code=400,
-            detail="Failed to fetch HubSpot contacts. Maybe invalid/expired token."     # Maybe!! Hmmmm :(
+    async def fetch_page(after):
+        params = {"limit": CONTACTS_PAGE_LIMIT}
+        if max_items is not None:
+            params["limit"] = max(1, min(CONTACTS_PAGE_LIMIT, max_items))
+        if after is not None:
+            params["after"] = after
+        response = await send_request(
+            "hubspot", "GET", BASE_URL, limit_key=access_token, headers=headers, params=params
         )
-
-    items = response.json().get("results", [])
-    integration_items = []
-    for item in items:
-        integration_items.append(
-            await create_integration_item_metadata_object(
-                item, 
-                item_type="Contact"
+        raise_for_rate_limit(response, "HubSpot")
+        if response.status_code != 200:
+            raise HTTPException(
+                status_code=400,
+                detail="Failed to fetch HubSpot contacts. Maybe invalid/expired token."     # Maybe!! Hmmmm :(
             )
+        return response.json()
+
+    # A partial load can't stand in for the whole account
+    scope = _sync_scope(org_id, user_id)
+    staging_key = new_staging_key("hubspot", scope) if max_pages is None and max_items is None else None
+    staged = False
+    committed = False
+    # The next delta starts here: a contact edited after its page was read is
+    # newer than this, whatever the pages read later hold
+    started_at = int(time.time() * 1000)
+
+    items_yielded = 0
+    pages_read = 0
+    # The next page is already in flight while this one is converted
+    pages = paginate(fetch_page, lambda page: page.get("results", []), hubspot_after)
+    try:
+        async for items in pages:
+            remember_contacts(org_id, user_id, items)
+            if staging_key is not None and items:
+                await stage_snapshot_records(staging_key, {str(item["id"]): item for item in items if item.get("id")})
+                staged = True
+            for item in items:
+                yield await create_integration_item_metadata_object(
+                    item,
+                    item_type="Contact"
+                )
+                items_yielded += 1
+                if max_items is not None and items_yielded >= max_items:
+                    return
+            pages_read += 1
+            if max_pages is not None and pages_read >= max_pages:
+                return
+
+        if staging_key is not None:
+            await commit_snapshot("hubspot", scope, staging_key if staged else None, started_at)
+            committed = True
+    finally:
+        await pages.aclose()
+        if staged and not committed:
+            await discard_staging(staging_key)
+
+
+async def iter_contact_changes(org_id: str, user_id: str, since: int):
+    """
+    Yield pages of contacts modified at or after `since` (epoch millis), via
+    the CRM search API, oldest change first.
+    Search stops paging at SEARCH_RESULT_CAP results, so a longer delta is
+    read as several queries, each restarting from the last change seen.
+    """
+    access_token = await get_valid_hubspot_access_token(org_id, user_id)
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": "application/json"
+    }
+
+    async def fetch_page(cursor):
+        modified_since, after = cursor
+        body = {
+            "filterGroups": [{"filters": [
+                {"propertyName": "lastmodifieddate", "operator": "GTE", "value": str(modified_since)}
+            ]}],
+            "sorts": [{"propertyName": "lastmodifieddate", "direction": "ASCENDING"}],
+            "properties": SEARCH_PROPERTIES,
+            "limit": CONTACTS_PAGE_LIMIT,
+        }
+        if after is not None:
+            body["after"] = after
+        response = await send_request(
+            "hubspot", "POST", SEARCH_URL, limit_key=access_token, headers=headers, json=body
         )
+        raise_for_rate_limit(response, "HubSpot")
+        if response.status_code != 200:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Failed to search HubSpot contacts. {response.text}"
+            )
+        page = response.json()
+        page["modified_since"] = modified_since
+        return page
 
-    return integration_items
+    def next_cursor(page):
+        after = hubspot_after(page)
+        if not after:
+            return None
+        if int(after) + CONTACTS_PAGE_LIMIT <= SEARCH_RESULT_CAP:
+            return (page["modified_since"], after)
+        # Out of search window: query again from the newest change on this page
+        newest = iso_to_millis(page["results"][-1].get("updatedAt")) if page.get("results") else None
+        if newest is None or newest <= page["modified_since"]:
+            # More than SEARCH_RESULT_CAP changes share one timestamp; nothing more we can do
+            return None
+        return (newest, None)
+
+    seen = set()
+    pages = paginate(fetch_page, lambda page: page.get("results", []), next_cursor, cursor=(since, None))
+    try:
+        async for contacts in pages:
+            # Restarted queries overlap the previous one, drop the repeats
+            fresh = [contact for contact in contacts if contact.get("id") and contact["id"] not in seen]
+            seen.update(contact["id"] for contact in fresh)
+            yield fresh
+    finally:
+        await pages.aclose()
+
+
+async def iter_items_hubspot_incremental(
+    credentials_or_str: Union[dict, str],
+    return_delta: bool = False,
+):
+    """
+    Load only the contacts changed since the last sync and merge them into
+    the snapshot kept in Redis. Yields the whole merged snapshot, or just the
+    changed contacts with `return_delta`.
+    Without a snapshot yet (or once it expired) this is a full load.
+    """
+    org_id, user_id = _parse_load_credentials(credentials_or_str)
+    scope = _sync_scope(org_id, user_id)
+
+    watermark = await get_sync_watermark("hubspot", scope)
+    if watermark is None:
+        full_load = iter_items_hubspot(credentials_or_str)
+        try:
+            async for item in full_load:
+                yield item
+        finally:
+            await full_load.aclose()
+        return
+
+    changes = iter_contact_changes(org_id, user_id, sync_since(watermark))
+    try:
+        async for contacts in changes:
+            remember_contacts(org_id, user_id, contacts)
+            await merge_snapshot_records("hubspot", scope, {str(contact["id"]): contact for contact in contacts})
+            watermark = max([watermark] + [iso_to_millis(contact.get("updatedAt")) or 0 for contact in contacts])
+            if return_delta:
+                for contact in contacts:
+                    yield await create_integration_item_metadata_object(contact, item_type="Contact")
+    finally:
+        await changes.aclose()
+    await advance_watermark("hubspot", scope, watermark)
+
+    if not return_delta:
+        async for contact in iter_snapshot("hubspot", scope):
+            yield await create_integration_item_metadata_object(contact, item_type="Contact")
+
+
+async def get_items_hubspot(
+    credentials_or_str: Union[dict, str],
+    max_pages: Optional[int] = None,
+    max_items: Optional[int] = None,
+    sync_mode: str = "full",
+    return_delta: bool = False,
+) -> list:
+    """
+    Fetch contacts from HubSpot using the provided credentials.
+    Return a list of IntegrationItem objects.
+    """
+    if sync_mode == "incremental":
+        items = iter_items_hubspot_incremental(credentials_or_str, return_delta)
+    else:
+        items = iter_items_hubspot(credentials_or_str, max_pages, max_items)
+    return [item async for item in items]
+
+
+def remember_contacts(org_id: str, user_id: str, contacts: List[dict]):
+    """
+    Note contacts HubSpot just returned as existing, for CONTACT_EXISTS_TTL seconds.
+    """
+    expires_at = time.time() + CONTACT_EXISTS_TTL
+    for contact in contacts:
+        if contact.get("id"):
+            _known_contacts.set((org_id, user_id, str(contact["id"])), True, expires_at)
+
+def forget_contacts(org_id: str, user_id: str, contact_ids: List[str]):
+    for contact_id in contact_ids:
+        _known_contacts.invalidate((org_id, user_id, str(contact_id)))
 
 
 async def get_contact(org_id: str, user_id: str, contact_id: str) -> dict:
@@ -291,11 +695,12 @@ async def get_contact(org_id: str, user_id: str, contact_id: str) -> dict:
     url = f"{BASE_URL}/{contact_id}"
     headers = {"Authorization": f"Bearer {access_token}"}
 
-    async with httpx.AsyncClient() as client:
-        response = await client.get(url, headers=headers)
+    response = await send_request("hubspot", "GET", url, limit_key=access_token, headers=headers)
     
     if response.status_code == 200:
-        return response.json()
+        contact = response.json()
+        remember_contacts(org_id, user_id, [contact])
+        return contact
     elif response.status_code == 404:
         raise HTTPException(
             status_code=404,
@@ -325,8 +730,7 @@ async def create_contact(org_id: str, user_id: str, properties: dict):
     }
     payload = {"properties": properties}
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, headers=headers, json=payload)
+    response = await send_request("hubspot", "POST", url, limit_key=access_token, headers=headers, json=payload)
 
     if response.status_code == 201:
         return response.json()
@@ -353,8 +757,7 @@ async def update_contact(org_id: str, user_id: str, contact_id: str, properties:
     }
     payload = {"properties": properties}
 
-    async with httpx.AsyncClient() as client:
-        response = await client.patch(url, headers=headers, json=payload)
+    response = await send_request("hubspot", "PATCH", url, limit_key=access_token, headers=headers, json=payload)
 
     if response.status_code == 200:
         return response.json()
@@ -373,32 +776,152 @@ async def delete_contact(org_id: str, user_id: str, contact_id: str):
     # So, though I tried to handle 404 separately
     # But, it's not working and any random ID when deleting
     # says successfully deleted. I TRIED!! :)
+    access_token = await get_valid_hubspot_access_token(org_id, user_id)
+    url = f"{BASE_URL}/{contact_id}"
+    headers = {"Authorization": f"Bearer {access_token}"}
 
     # A cleaver way to handle Hubspot's 204 response for DELETE
-    # Checking if contact exists by GET operation
-    try:
-        contact = await get_contact(org_id, user_id, contact_id)
-    except HTTPException as exc:
-        # If get_contact raises 404, re-raise as does not exist
-        if exc.status_code == 404:
+    # Checking if contact exists, unless a recent load/batch read already saw it.
+    # The check asks for a single property so the response stays tiny.
+    if _known_contacts.get((org_id, user_id, contact_id)) is None:
+        response = await send_request(
+            "hubspot", "GET", url, limit_key=access_token,
+            headers=headers, params={"properties": "hs_object_id"}
+        )
+        if response.status_code == 404:
             raise HTTPException(
                 status_code=404,
                 detail=f"Contact {contact_id} does not exist, cannot delete."
             )
-        else:
+        elif response.status_code != 200:
             # Something happened :((
-            raise
-    access_token = await get_valid_hubspot_access_token(org_id, user_id)
-    url = f"{BASE_URL}/{contact_id}"
-    headers = {"Authorization": f"Bearer {access_token}"}
+            raise HTTPException(
+                status_code=response.status_code,
+                detail=f"Failed to retrieve HubSpot contact {contact_id}. {response.text}"
+            )
 
-    async with httpx.AsyncClient() as client:
-        response = await client.delete(url, headers=headers)
+    response = await send_request("hubspot", "DELETE", url, limit_key=access_token, headers=headers)
 
     if response.status_code == 204:
+        forget_contacts(org_id, user_id, [contact_id])
+        # Deletions never show up in a delta query, so drop it from the sync snapshot here
+        await remove_snapshot_records("hubspot", _sync_scope(org_id, user_id), [contact_id])
         return {"message": f"Contact {contact_id} successfully deleted."}
     else:
         raise HTTPException(
             status_code=response.status_code,
             detail=f"Failed to delete HubSpot contact {contact_id}. {response.text}"
-        )
\ No newline at end of file
+        )
+
+
+async def _run_contacts_batch(
+    org_id: str,
+    user_id: str,
+    action: str,
+    inputs: List[dict],
+    extra_body: Optional[dict] = None,
+) -> dict:
+    """
+    Send `inputs` to `/crm/v3/objects/contacts/batch/{action}` in chunks of
+    BATCH_SIZE, up to BATCH_CONCURRENCY chunks at a time.
+    Returns the combined per-record results and errors.
+    """
+    if not inputs:
+        raise HTTPException(status_code=400, detail="No records given for the batch.")
+
+    access_token = await get_valid_hubspot_access_token(org_id, user_id)
+    url = f"{BASE_URL}/batch/{action}"
+    headers = {
+        "Authorization": f"Bearer {access_token}",
+        "Content-Type": "application/json"
+    }
+    semaphore = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def send_chunk(chunk: List[dict]) -> Tuple[list, list]:
+        async with semaphore:
+            response = await send_request(
+                "hubspot", "POST", url, limit_key=access_token,
+                headers=headers, json={**(extra_body or {}), "inputs": chunk}
+            )
+
+        if response.status_code == 204:
+            # archive answers with no body on success
+            return [{"id": record["id"], "status": "archived"} for record in chunk], []
+        if response.status_code in (200, 201, 207):
+            # 207 (multi-status) carries per-record errors next to the results
+            data = response.json()
+            return data.get("results", []), data.get("errors", [])
+
+        # The whole chunk failed: report an error for every record in it
+        return [], [
+            {
+                "status": "error",
+                "http_status": response.status_code,
+                "message": response.text,
+                "input": record,
+            }
+            for record in chunk
+        ]
+
+    chunks = [inputs[i:i + BATCH_SIZE] for i in range(0, len(inputs), BATCH_SIZE)]
+    outcomes = await asyncio.gather(*(send_chunk(chunk) for chunk in chunks))
+
+    results = [result for chunk_results, _ in outcomes for result in chunk_results]
+    errors = [error for _, chunk_errors in outcomes for error in chunk_errors]
+
+    if action == "archive":
+        # Only what HubSpot confirmed: whole 204 chunks plus the 207 `results`,
+        # never ids of failed chunks or per-record errors
+        archived = [str(result["id"]) for result in results if result.get("id")]
+        if archived:
+            forget_contacts(org_id, user_id, archived)
+            await remove_snapshot_records("hubspot", _sync_scope(org_id, user_id), archived)
+    else:
+        remember_contacts(org_id, user_id, results)
+    return {
+        "results": results,
+        "errors": errors,
+        "num_results": len(results),
+        "num_errors": len(errors),
+    }
+
+
+async def batch_create_contacts(org_id: str, user_id: str, properties_list: List[dict]) -> dict:
+    """
+    Create many contacts. `properties_list` is a list of property dicts,
+    same shape as for `create_contact`.
+    """
+    inputs = [{"properties": properties} for properties in properties_list]
+    return await _run_contacts_batch(org_id, user_id, "create", inputs)
+
+
+async def batch_update_contacts(org_id: str, user_id: str, updates: List[dict]) -> dict:
+    """
+    Update many contacts. `updates` is a list like:
+      [{"id": "123", "properties": {"firstname": "NewName"}}, ...]
+    """
+    inputs = [{"id": str(update["id"]), "properties": update.get("properties", {})} for update in updates]
+    return await _run_contacts_batch(org_id, user_id, "update", inputs)
+
+
+async def batch_read_contacts(
+    org_id: str,
+    user_id: str,
+    contact_ids: List[str],
+    properties: Optional[List[str]] = None,
+) -> dict:
+    """
+    Read many contacts by ID, optionally limited to the given `properties`.
+    """
+    inputs = [{"id": str(contact_id)} for contact_id in contact_ids]
+    return await _run_contacts_batch(
+        org_id, user_id, "read", inputs, extra_body={"properties": properties or []}
+    )
+
+
+async def batch_archive_contacts(org_id: str, user_id: str, contact_ids: List[str]) -> dict:
+    """
+    Archive (delete) many contacts by ID.
+    """
+    inputs = [{"id": str(contact_id)} for contact_id in contact_ids]
+    return await _run_contacts_batch(org_id, user_id, "archive", inputs)
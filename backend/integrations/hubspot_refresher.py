@@ -0,0 +1,110 @@
+# hubspot_refresher.py
+
+import os
+import time
+import asyncio
+import logging
+
+from fastapi import HTTPException
+
+from integrations.hubspot import (
+    CREDENTIALS_ACTIVITY_INDEX,
+    CREDENTIALS_EXPIRY_INDEX,
+    get_hubspot_credentials,
+    refresh_access_token,
+)
+from log import log_event
+from redis_client import (
+    get_sorted_set_range_redis,
+    get_sorted_set_scores_redis,
+    redis_pipeline,
+)
+
+logger = logging.getLogger(__name__)
+
+# Refresh tokens this many seconds before they expire. Must be larger than
+# the request-path skew (30s) so handlers almost never block on a refresh.
+REFRESH_LEAD_SECONDS = int(os.getenv("HUBSPOT_REFRESHER_LEAD", "45"))
+# How often the expiry index is scanned
+REFRESHER_INTERVAL = float(os.getenv("HUBSPOT_REFRESHER_INTERVAL", "5"))
+# Max token exchanges in flight at once, per worker
+REFRESHER_CONCURRENCY = int(os.getenv("HUBSPOT_REFRESHER_CONCURRENCY", "5"))
+# Max entries picked up per scan
+REFRESHER_BATCH_SIZE = int(os.getenv("HUBSPOT_REFRESHER_BATCH_SIZE", "200"))
+# Tokens of users idle for longer are no longer refreshed and expire from Redis
+REFRESHER_IDLE_SECONDS = int(os.getenv("HUBSPOT_REFRESHER_IDLE", "3600"))
+
+
+async def _forget(*members: bytes):
+    """Drop members from both indexes, so the refresher stops looking at them."""
+    async with redis_pipeline(transaction=False) as pipe:
+        pipe.zrem(CREDENTIALS_EXPIRY_INDEX, *members)
+        pipe.zrem(CREDENTIALS_ACTIVITY_INDEX, *members)
+        await pipe.execute()
+
+
+async def refresh_expiring_tokens() -> int:
+    """
+    Refresh every stored HubSpot token expiring within REFRESH_LEAD_SECONDS,
+    soonest first, for users active in the last REFRESHER_IDLE_SECONDS.
+    Idle users are dropped from the index. Returns how many entries were processed.
+    """
+    now = int(time.time())
+    due = await get_sorted_set_range_redis(
+        CREDENTIALS_EXPIRY_INDEX,
+        now + REFRESH_LEAD_SECONDS,
+        limit=REFRESHER_BATCH_SIZE,
+    )
+    last_active = await get_sorted_set_scores_redis(CREDENTIALS_ACTIVITY_INDEX, *due)
+    idle = [
+        member for member, active_at in zip(due, last_active)
+        if active_at is None or active_at < now - REFRESHER_IDLE_SECONDS
+    ]
+    if idle:
+        # Their credentials simply expire; the next request asks them to log in again
+        await _forget(*idle)
+    idle = set(idle)
+    semaphore = asyncio.Semaphore(REFRESHER_CONCURRENCY)
+
+    async def refresh_one(member: bytes):
+        org_id, _, user_id = member.decode("utf-8").partition(":")
+        async with semaphore:
+            try:
+                credentials = await get_hubspot_credentials(user_id, org_id, use_cache=False)
+            except HTTPException:
+                # Credentials are gone (expired from Redis), nothing left to refresh
+                await _forget(member)
+                return
+            try:
+                # Goes through the same single-flight + Redis lock as the request path,
+                # so several workers scanning the index never double-refresh
+                await refresh_access_token(
+                    org_id,
+                    user_id,
+                    credentials.get("refresh_token"),
+                    min_validity=REFRESH_LEAD_SECONDS,
+                )
+            except HTTPException as exc:
+                # Left in the index, retried on the next scan
+                log_event(
+                    logger, logging.WARNING, "Background token refresh failed",
+                    org_id=org_id, user_id=user_id, detail=exc.detail,
+                )
+
+    await asyncio.gather(*(refresh_one(member) for member in due if member not in idle))
+    return len(due)
+
+
+async def run_token_refresher():
+    """
+    Background loop started from the FastAPI lifespan.
+    """
+    while True:
+        try:
+            await refresh_expiring_tokens()
+        except asyncio.CancelledError:
+            raise
+        except Exception as exc:
+            # Redis hiccup etc., try again on the next tick
+            log_event(logger, logging.WARNING, "Token expiry scan failed", error=repr(exc))
+        await asyncio.sleep(REFRESHER_INTERVAL)
@@ -2,6 +2,26 @@ from datetime import datetime
 from typing import Optional, List
 
 class IntegrationItem:
+    # Slotted so that large loads (100k+ contacts) don't pay for a per-instance __dict__
+    __slots__ = (
+        'id',
+        'type',
+        'directory',
+        'parent_path_or_name',
+        'parent_id',
+        'name',
+        'email',
+        'last_name',
+        'creation_time',
+        'last_modified_time',
+        'url',
+        'children',
+        'mime_type',
+        'delta',
+        'drive_id',
+        'visibility',
+    )
+
     def __init__(
         self,
         id: Optional[str] = None,
@@ -37,3 +57,33 @@ class IntegrationItem:
         self.delta = delta
         self.drive_id = drive_id
         self.visibility = visibility
+
+    def to_dict(self) -> dict:
+        """
+        JSON-ready dict of all fields, in declaration order.
+        Avoids FastAPI's generic jsonable_encoder introspection on the hot path.
+        """
+        creation_time = self.creation_time
+        last_modified_time = self.last_modified_time
+        return {
+            'id': self.id,
+            'type': self.type,
+            'directory': self.directory,
+            'parent_path_or_name': self.parent_path_or_name,
+            'parent_id': self.parent_id,
+            'name': self.name,
+            'email': self.email,
+            'last_name': self.last_name,
+            'creation_time': (
+                creation_time.isoformat() if isinstance(creation_time, datetime) else creation_time
+            ),
+            'last_modified_time': (
+                last_modified_time.isoformat() if isinstance(last_modified_time, datetime) else last_modified_time
+            ),
+            'url': self.url,
+            'children': self.children,
+            'mime_type': self.mime_type,
+            'delta': self.delta,
+            'drive_id': self.drive_id,
+            'visibility': self.visibility,
+        }
@@ -1,25 +1,47 @@
 # notion.py
 
+import os
 import json
+import time
 import secrets
 from fastapi import Request, HTTPException
 from fastapi.responses import HTMLResponse
-import httpx
-import asyncio
 import base64
-import requests
+from fingerprint import token_fingerprint
 from integrations.integration_item import IntegrationItem
+from integrations.pagination import paginate, notion_cursor
+from integrations.sync_state import (
+    advance_watermark,
+    commit_snapshot,
+    discard_staging,
+    get_sync_watermark,
+    iso_to_millis,
+    iter_snapshot,
+    merge_snapshot_records,
+    new_staging_key,
+    remove_snapshot_records,
+    stage_snapshot_records,
+    sync_since,
+)
+from rate_limiter import send_request, raise_for_rate_limit
+from tracing import tag_request
 
-from redis_client import add_key_value_redis, get_value_redis, delete_key_redis
+from redis_client import add_key_value_redis, consume_key_redis
 
 CLIENT_ID = 'XXX'
 CLIENT_SECRET = 'XXX'
 encoded_client_id_secret = base64.b64encode(f'{CLIENT_ID}:{CLIENT_SECRET}'.encode()).decode()
 
 REDIRECT_URI = 'http://localhost:8000/integrations/notion/oauth2callback'
+# Overridable so the offline benchmarks can point at a local mock server
+API_BASE = os.getenv('NOTION_API_BASE', 'https://api.notion.com')
+SEARCH_URL = f'{API_BASE}/v1/search'
+# Notion caps search results at 100 per page
+SEARCH_PAGE_SIZE = 100
 authorization_url = f'https://api.notion.com/v1/oauth/authorize?client_id={CLIENT_ID}&response_type=code&owner=user&redirect_uri=http%3A%2F%2Flocalhost%3A8000%2Fintegrations%2Fnotion%2Foauth2callback'
 
 async def authorize_notion(user_id, org_id):
+    tag_request(org_id=org_id, user_id=user_id)
     state_data = {
         'state': secrets.token_urlsafe(32),
         'user_id': user_id,
@@ -40,28 +62,29 @@ async def oauth2callback_notion(request: Request):
     original_state = state_data.get('state')
     user_id = state_data.get('user_id')
     org_id = state_data.get('org_id')
+    tag_request(org_id=org_id, user_id=user_id)
 
-    saved_state = await get_value_redis(f'notion_state:{org_id}:{user_id}')
+    # The state is single-use: read and delete it in one round trip
+    saved_state = await consume_key_redis(f'notion_state:{org_id}:{user_id}')
 
     if not saved_state or original_state != json.loads(saved_state).get('state'):
         raise HTTPException(status_code=400, detail='State does not match.')
 
-    async with httpx.AsyncClient() as client:
-        response, _ = await asyncio.gather(
-            client.post(
-                'https://api.notion.com/v1/oauth/token',
-                json={
-                    'grant_type': 'authorization_code',
-                    'code': code,
-                    'redirect_uri': REDIRECT_URI
-                }, 
-                headers={
-                    'Authorization': f'Basic {encoded_client_id_secret}',
-                    'Content-Type': 'application/json',
-                }
-            ),
-            delete_key_redis(f'notion_state:{org_id}:{user_id}'),
-        )
+    response = await send_request(
+        'notion',
+        'POST',
+        f'{API_BASE}/v1/oauth/token',
+        limit_key=CLIENT_ID,
+        json={
+            'grant_type': 'authorization_code',
+            'code': code,
+            'redirect_uri': REDIRECT_URI
+        }, 
+        headers={
+            'Authorization': f'Basic {encoded_client_id_secret}',
+            'Content-Type': 'application/json',
+        }
+    )
 
     await add_key_value_redis(f'notion_credentials:{org_id}:{user_id}', json.dumps(response.json()), expire=600)
     
@@ -75,13 +98,13 @@ async def oauth2callback_notion(request: Request):
     return HTMLResponse(content=close_window_script)
 
 async def get_notion_credentials(user_id, org_id):
-    credentials = await get_value_redis(f'notion_credentials:{org_id}:{user_id}')
+    tag_request(org_id=org_id, user_id=user_id)
+    credentials = await consume_key_redis(f'notion_credentials:{org_id}:{user_id}')
     if not credentials:
         raise HTTPException(status_code=400, detail='No credentials found.')
     credentials = json.loads(credentials)
     if not credentials:
         raise HTTPException(status_code=400, detail='No credentials found.')
-    await delete_key_redis(f'notion_credentials:{org_id}:{user_id}')
 
     return credentials
 
@@ -103,11 +126,37 @@ def _recursive_dict_search(data, target_key):
                         return result
     return None
 
+def _first_rich_text(rich_text):
+    """Text of the first segment of a rich text array, None if there isn't one."""
+    if not isinstance(rich_text, list) or not rich_text or not isinstance(rich_text[0], dict):
+        return None
+    segment = rich_text[0]
+    content = (segment.get('text') or {}).get('content')
+    return content if content is not None else segment.get('plain_text')
+
+def _extract_title(response_json: dict):
+    """
+    Go straight to the title instead of walking the whole result: a page's
+    title-type property, or a database's own `title`.
+    """
+    for prop in (response_json.get('properties') or {}).values():
+        if isinstance(prop, dict) and prop.get('type') == 'title':
+            title = _first_rich_text(prop.get('title'))
+            if title is not None:
+                return title
+            # Untitled page; every page has exactly one title property
+            break
+    return _first_rich_text(response_json.get('title'))
+
 def create_integration_item_metadata_object(
     response_json: str,
 ) -> IntegrationItem:
     """creates an integration metadata object from the response"""
-    name = _recursive_dict_search(response_json['properties'], 'content')
+    name = _extract_title(response_json)
+    if name is None:
+        # Untitled or unusually shaped results: fall back to the generic search
+        name = _recursive_dict_search(response_json['properties'], 'content')
+        name = _recursive_dict_search(response_json, 'content') if name is None else name
     parent_type = (
         ''
         if response_json['parent']['type'] is None
@@ -120,7 +169,6 @@ def create_integration_item_metadata_object(
             response_json['parent'][parent_type]
         )
 
-    name = _recursive_dict_search(response_json, 'content') if name is None else name
     name = 'multi_select' if name is None else name
     name = response_json['object'] + ' ' + name
 
@@ -135,24 +183,144 @@ def create_integration_item_metadata_object(
 
     return integration_item_metadata
 
-async def get_items_notion(credentials) -> list[IntegrationItem]:
-    """Aggregates all metadata relevant for a notion integration"""
+def _sync_scope(credentials: dict) -> str:
+    """
+    Snapshots are per authorization (bot), not per workspace: two users of one
+    workspace may see different pages. Falls back to the token itself.
+    """
+    return credentials.get('bot_id') or token_fingerprint(credentials.get('access_token'))
+
+def _is_removed(result: dict) -> bool:
+    return bool(result.get('archived') or result.get('in_trash'))
+
+async def iter_items_notion(credentials):
+    """
+    Yields IntegrationItems as each search page is parsed.
+    A complete load also rebuilds the snapshot incremental loads start from.
+    """
     credentials = json.loads(credentials)
-    response = requests.post(
-        'https://api.notion.com/v1/search',
-        headers={
-            'Authorization': f'Bearer {credentials.get("access_token")}',
-            'Notion-Version': '2022-06-28',
-        },
-    )
+    access_token = credentials.get('access_token')
+    headers = {
+        'Authorization': f'Bearer {access_token}',
+        'Notion-Version': '2022-06-28',
+    }
+    async def fetch_page(start_cursor):
+        body = {'page_size': SEARCH_PAGE_SIZE}
+        if start_cursor is not None:
+            body['start_cursor'] = start_cursor
+        response = await send_request(
+            'notion', 'POST', SEARCH_URL, limit_key=access_token, headers=headers, json=body
+        )
+        raise_for_rate_limit(response, 'Notion')
+        if response.status_code != 200:
+            # Ending early would pass a partial load off as the full workspace
+            raise HTTPException(status_code=400, detail='Failed to search Notion.')
+        return response.json()
+
+    scope = _sync_scope(credentials)
+    staging_key = new_staging_key('notion', scope)
+    staged = False
+    committed = False
+    # The next delta starts here: a page edited after it was read is newer
+    # than this, whatever the results read later hold
+    started_at = int(time.time() * 1000)
+
+    # The next cursor page is requested while the current one is parsed
+    pages = paginate(fetch_page, lambda page: page.get('results', []), notion_cursor)
+    try:
+        async for results in pages:
+            records = {result['id']: result for result in results if not _is_removed(result)}
+            if records:
+                await stage_snapshot_records(staging_key, records)
+                staged = True
+            for result in results:
+                yield create_integration_item_metadata_object(result)
+
+        await commit_snapshot('notion', scope, staging_key if staged else None, started_at)
+        committed = True
+    finally:
+        await pages.aclose()
+        if staged and not committed:
+            await discard_staging(staging_key)
+
+async def iter_items_notion_incremental(credentials, return_delta=False):
+    """
+    Reads search results newest edit first and stops at the last sync's
+    watermark, merging the changes into the bot's snapshot.
+    Yields the whole merged snapshot, or only the changes with `return_delta`.
+    """
+    parsed = json.loads(credentials)
+    scope = _sync_scope(parsed)
+    watermark = await get_sync_watermark('notion', scope)
+    if watermark is None:
+        # Nothing to build on yet, a full load seeds the snapshot
+        full_load = iter_items_notion(credentials)
+        try:
+            async for item in full_load:
+                yield item
+        finally:
+            await full_load.aclose()
+        return
 
-    if response.status_code == 200:
-        results = response.json()['results']
-        list_of_integration_item_metadata = []
-        for result in results:
-            list_of_integration_item_metadata.append(
-                create_integration_item_metadata_object(result)
+    access_token = parsed.get('access_token')
+    headers = {
+        'Authorization': f'Bearer {access_token}',
+        'Notion-Version': '2022-06-28',
+    }
+    since = sync_since(watermark)
+
+    async def fetch_page(start_cursor):
+        body = {
+            'page_size': SEARCH_PAGE_SIZE,
+            'sort': {'direction': 'descending', 'timestamp': 'last_edited_time'},
+        }
+        if start_cursor is not None:
+            body['start_cursor'] = start_cursor
+        response = await send_request(
+            'notion', 'POST', SEARCH_URL, limit_key=access_token, headers=headers, json=body
+        )
+        raise_for_rate_limit(response, 'Notion')
+        if response.status_code != 200:
+            # A silently short delta would be recorded as complete
+            raise HTTPException(status_code=400, detail='Failed to search Notion for changes.')
+        return response.json()
+
+    new_watermark = watermark
+    pages = paginate(fetch_page, lambda page: page.get('results', []), notion_cursor)
+    try:
+        async for results in pages:
+            changed = []
+            reached_watermark = False
+            for result in results:
+                edited = iso_to_millis(result.get('last_edited_time')) or 0
+                if edited < since:
+                    reached_watermark = True
+                    break
+                new_watermark = max(new_watermark, edited)
+                changed.append(result)
+
+            removed = [result['id'] for result in changed if _is_removed(result)]
+            await merge_snapshot_records(
+                'notion', scope, {result['id']: result for result in changed if not _is_removed(result)}
             )
+            await remove_snapshot_records('notion', scope, removed)
+            if return_delta:
+                for result in changed:
+                    yield create_integration_item_metadata_object(result)
+            if reached_watermark:
+                break
+    finally:
+        await pages.aclose()
+    await advance_watermark('notion', scope, new_watermark)
+
+    if not return_delta:
+        async for result in iter_snapshot('notion', scope):
+            yield create_integration_item_metadata_object(result)
 
-        print(list_of_integration_item_metadata)
-    return
+async def get_items_notion(credentials, sync_mode='full', return_delta=False) -> list[IntegrationItem]:
+    """Aggregates all metadata relevant for a notion integration"""
+    if sync_mode == 'incremental':
+        items = iter_items_notion_incremental(credentials, return_delta)
+    else:
+        items = iter_items_notion(credentials)
+    return [item async for item in items]
@@ -0,0 +1,76 @@
+# pagination.py
+
+import asyncio
+from contextvars import ContextVar
+from typing import Any, AsyncIterator, Awaitable, Callable, Optional
+
+# Called with each page's item count as the page is handed on. Background load
+# jobs (jobs.py) set it to report how many pages are done.
+page_listener: ContextVar[Optional[Callable[[int], None]]] = ContextVar('page_listener', default=None)
+
+
+def _page_loaded(items: list) -> list:
+    listener = page_listener.get()
+    if listener is not None:
+        listener(len(items))
+    return items
+
+
+async def paginate(
+    fetch_page: Callable[[Optional[str]], Awaitable[Optional[dict]]],
+    get_items: Callable[[dict], list],
+    get_next_cursor: Callable[[dict], Optional[str]],
+    cursor: Optional[str] = None,
+    prefetch: bool = True,
+) -> AsyncIterator[list]:
+    """
+    Walk a cursor-paginated API iteratively, yielding one page of items at a time.
+
+    `fetch_page(cursor)` returns the decoded page (or None to stop),
+    `get_items(page)` pulls the records out of it and
+    `get_next_cursor(page)` returns the cursor for the next page (falsy when done).
+    With `prefetch` the next page is requested before the current one is handed
+    to the caller, so parsing a page overlaps with fetching the next.
+    """
+    if not prefetch:
+        while True:
+            page = await fetch_page(cursor)
+            if page is None:
+                return
+            yield _page_loaded(get_items(page))
+            cursor = get_next_cursor(page)
+            if not cursor:
+                return
+
+    next_page = asyncio.ensure_future(fetch_page(cursor))
+    try:
+        while next_page is not None:
+            page = await next_page
+            next_page = None
+            if page is None:
+                return
+            cursor = get_next_cursor(page)
+            if cursor:
+                next_page = asyncio.ensure_future(fetch_page(cursor))
+            yield _page_loaded(get_items(page))
+    finally:
+        # The caller stopped early (or failed), drop the in-flight request
+        if next_page is not None and not next_page.done():
+            next_page.cancel()
+
+
+# Cursor extractors for the providers we talk to
+
+def airtable_offset(page: dict) -> Optional[str]:
+    """Airtable returns `offset` while there are more pages."""
+    return page.get('offset')
+
+
+def notion_cursor(page: dict) -> Optional[str]:
+    """Notion returns `next_cursor` together with `has_more`."""
+    return page.get('next_cursor') if page.get('has_more') else None
+
+
+def hubspot_after(page: dict) -> Optional[Any]:
+    """HubSpot returns `paging.next.after` while there are more pages."""
+    return page.get('paging', {}).get('next', {}).get('after')
@@ -0,0 +1,119 @@
+# sync_state.py
+
+import os
+import json
+import secrets
+from datetime import datetime
+from typing import AsyncIterator, Dict, Iterable, Optional
+
+from redis_client import (
+    get_value_redis,
+    delete_key_redis,
+    delete_hash_fields_redis,
+    iter_hash_redis,
+    redis_pipeline,
+)
+
+# Shared bookkeeping for incremental loads. Per provider and scope (org/user,
+# Notion bot, ...) Redis keeps:
+#   sync:{provider:scope}:watermark  last-modified high-water mark, epoch millis
+#   sync:{provider:scope}:snapshot   hash of record id -> raw record JSON
+# Both expire together; once they do, the next incremental load falls back to
+# a full sync. That is also when deletions made outside this app drop out.
+SYNC_STATE_TTL = int(os.getenv("SYNC_STATE_TTL", "86400"))
+# Changes are re-read from this far before the watermark, to cover search
+# index lag and clock skew. Re-reading a record is harmless, missing one isn't.
+SYNC_OVERLAP_SECONDS = int(os.getenv("SYNC_OVERLAP_SECONDS", "60"))
+
+
+def _key(provider: str, scope: str, name: str) -> str:
+    # The {hash tag} keeps all of a scope's keys in one cluster slot, so
+    # RENAME and MULTI across them work in cluster mode too
+    return f"sync:{{{provider}:{scope}}}:{name}"
+
+
+def iso_to_millis(value: Optional[str]) -> Optional[int]:
+    """'2024-06-01T12:34:56.789Z' -> epoch millis (None if missing/unparseable)."""
+    if not value:
+        return None
+    try:
+        return int(datetime.fromisoformat(value.replace("Z", "+00:00")).timestamp() * 1000)
+    except ValueError:
+        return None
+
+
+async def get_sync_watermark(provider: str, scope: str) -> Optional[int]:
+    """The last recorded high-water mark, or None if there's no usable snapshot."""
+    value = await get_value_redis(_key(provider, scope, "watermark"))
+    return int(value) if value is not None else None
+
+
+def sync_since(watermark: int) -> int:
+    """Where to start reading changes from for a given watermark."""
+    return max(0, watermark - SYNC_OVERLAP_SECONDS * 1000)
+
+
+def new_staging_key(provider: str, scope: str) -> str:
+    """A private hash a full sync fills before swapping it in as the snapshot."""
+    return _key(provider, scope, f"staging:{secrets.token_hex(4)}")
+
+
+async def stage_snapshot_records(staging_key: str, records: Dict[str, dict]):
+    if not records:
+        return
+    async with redis_pipeline(transaction=False) as pipe:
+        pipe.hset(staging_key, mapping={record_id: json.dumps(record) for record_id, record in records.items()})
+        pipe.expire(staging_key, SYNC_STATE_TTL)
+        await pipe.execute()
+
+
+async def commit_snapshot(provider: str, scope: str, staging_key: Optional[str], watermark: int):
+    """
+    Atomically replace the snapshot with the staged hash (None when the full
+    sync found no records) and record `watermark`.
+    """
+    snapshot_key = _key(provider, scope, "snapshot")
+    async with redis_pipeline() as pipe:
+        if staging_key is not None:
+            pipe.rename(staging_key, snapshot_key)
+            pipe.expire(snapshot_key, SYNC_STATE_TTL)
+        else:
+            pipe.delete(snapshot_key)
+        pipe.set(_key(provider, scope, "watermark"), watermark, ex=SYNC_STATE_TTL)
+        await pipe.execute()
+
+
+async def discard_staging(staging_key: str):
+    await delete_key_redis(staging_key)
+
+
+async def merge_snapshot_records(provider: str, scope: str, records: Dict[str, dict]):
+    """Upsert changed records into the snapshot."""
+    if not records:
+        return
+    snapshot_key = _key(provider, scope, "snapshot")
+    async with redis_pipeline() as pipe:
+        pipe.hset(snapshot_key, mapping={record_id: json.dumps(record) for record_id, record in records.items()})
+        pipe.expire(snapshot_key, SYNC_STATE_TTL)
+        await pipe.execute()
+
+
+async def advance_watermark(provider: str, scope: str, watermark: int):
+    """Record `watermark` once a delta has been merged, and keep the snapshot alive with it."""
+    async with redis_pipeline() as pipe:
+        pipe.set(_key(provider, scope, "watermark"), watermark, ex=SYNC_STATE_TTL)
+        pipe.expire(_key(provider, scope, "snapshot"), SYNC_STATE_TTL)
+        await pipe.execute()
+
+
+async def remove_snapshot_records(provider: str, scope: str, record_ids: Iterable[str]):
+    """Drop records this app deleted, which a delta query would never report."""
+    await delete_hash_fields_redis(
+        _key(provider, scope, "snapshot"), *(str(record_id) for record_id in record_ids)
+    )
+
+
+async def iter_snapshot(provider: str, scope: str) -> AsyncIterator[dict]:
+    """Yield every record in the snapshot, scanned incrementally."""
+    async for _, value in iter_hash_redis(_key(provider, scope, "snapshot")):
+        yield json.loads(value)
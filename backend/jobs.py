@@ -0,0 +1,353 @@
+"""
+Background load jobs, for loads too large to finish within one HTTP request.
+
+`/integrations/{provider}/load` with `job=true` answers 202 right away with a
+job id; the load then runs in a worker that appends the items to Redis in
+chunks and keeps a progress hash up to date:
+
+    load_job:{<id>}:status   hash: state, pages, items, chunks, error, timestamps
+    load_job:{<id>}:params   the load's arguments (credentials included), read once
+    load_job:{<id>}:results  list of chunks, each a JSON array of items
+
+GET /jobs/<id> reports progress, GET /jobs/<id>/results pages through the
+chunks (already while the job runs). Everything expires after LOAD_JOB_TTL.
+
+Workers run in the API process (LOAD_JOB_WORKERS=inprocess, the default), or in
+a separate pool of processes fed through a Redis queue (LOAD_JOB_WORKERS=external):
+
+    cd backend
+    python -m jobs --processes 2 --concurrency 4
+"""
+
+import os
+import json
+import time
+import asyncio
+import logging
+import secrets
+import argparse
+import multiprocessing
+from typing import Optional
+
+from fastapi import HTTPException
+
+from integrations.airtable import iter_items_airtable
+from integrations.hubspot import (
+    iter_items_hubspot,
+    iter_items_hubspot_incremental,
+    listen_for_credential_invalidations,
+)
+from integrations.notion import iter_items_notion, iter_items_notion_incremental
+from integrations.pagination import page_listener
+from http_client import init_http_clients, close_http_clients
+from log import configure_logging, log_event
+from metrics import ITEMS_PER_LOAD, LOAD_JOBS
+from snapshots import SnapshotBuilder, is_complete_load
+from redis_client import (
+    blocking_pop_redis,
+    consume_key_redis,
+    get_hash_redis,
+    get_list_range_redis,
+    redis_pipeline,
+)
+from tracing import span
+
+# inprocess | external
+LOAD_JOB_WORKERS = os.getenv("LOAD_JOB_WORKERS", "inprocess").lower()
+# Jobs one process runs at the same time
+LOAD_JOB_CONCURRENCY = int(os.getenv("LOAD_JOB_CONCURRENCY", "4"))
+# Items per stored result chunk
+LOAD_JOB_CHUNK_SIZE = int(os.getenv("LOAD_JOB_CHUNK_SIZE", "500"))
+# Seconds a job's status and results are kept, counted from its last update
+LOAD_JOB_TTL = int(os.getenv("LOAD_JOB_TTL", "3600"))
+LOAD_JOB_QUEUE = "load_jobs:queue"
+# How long an external worker blocks on the queue per poll; must stay below
+# REDIS_SOCKET_TIMEOUT or the read times out first
+QUEUE_POLL_SECONDS = 1
+
+logger = logging.getLogger(__name__)
+
+# In-process mode: running jobs (kept referenced until done) and their limit
+_running = set()
+_slots: Optional[asyncio.Semaphore] = None
+
+
+def _key(job_id: str, name: str) -> str:
+    # One {hash tag} per job, so a chunk and its progress update share a slot
+    return f"load_job:{{{job_id}}}:{name}"
+
+
+def _iter_items(params: dict):
+    """The same item iterator the synchronous /load route would use."""
+    provider = params["provider"]
+    credentials = params["credentials"]
+    incremental = params.get("sync_mode") == "incremental"
+    if provider == "hubspot":
+        if incremental:
+            return iter_items_hubspot_incremental(credentials, params.get("return_delta", False))
+        return iter_items_hubspot(credentials, max_pages=params.get("max_pages"), max_items=params.get("max_items"))
+    if provider == "notion":
+        if incremental:
+            return iter_items_notion_incremental(credentials, params.get("return_delta", False))
+        return iter_items_notion(credentials)
+    return iter_items_airtable(credentials)
+
+
+async def enqueue_load_job(provider: str, credentials: str, **options) -> dict:
+    """
+    Record a new job and hand it to a worker. `options` are the load route's
+    own arguments (sync_mode, max_pages, ...).
+    """
+    job_id = secrets.token_urlsafe(16)
+    params = {"provider": provider, "credentials": credentials, **options}
+    now = int(time.time())
+    async with redis_pipeline() as pipe:
+        pipe.hset(_key(job_id, "status"), mapping={
+            "job_id": job_id,
+            "provider": provider,
+            "state": "queued",
+            "pages": 0,
+            "items": 0,
+            "chunks": 0,
+            "created_at": now,
+            "updated_at": now,
+        })
+        pipe.expire(_key(job_id, "status"), LOAD_JOB_TTL)
+        pipe.set(_key(job_id, "params"), json.dumps(params), ex=LOAD_JOB_TTL)
+        await pipe.execute()
+    LOAD_JOBS.labels(provider, "queued").inc()
+
+    if LOAD_JOB_WORKERS == "external":
+        async with redis_pipeline(transaction=False) as pipe:
+            pipe.rpush(LOAD_JOB_QUEUE, job_id)
+            await pipe.execute()
+    else:
+        task = asyncio.ensure_future(_run_in_process(job_id))
+        _running.add(task)
+        task.add_done_callback(_running.discard)
+
+    return {
+        "job_id": job_id,
+        "state": "queued",
+        "status_url": f"/jobs/{job_id}",
+        "results_url": f"/jobs/{job_id}/results",
+    }
+
+
+async def _run_in_process(job_id: str):
+    global _slots
+    if _slots is None:
+        _slots = asyncio.Semaphore(LOAD_JOB_CONCURRENCY)
+    async with _slots:
+        await run_load_job(job_id)
+
+
+async def cancel_in_process_jobs():
+    """Stop this process's running jobs on shutdown; they are marked failed."""
+    for task in list(_running):
+        task.cancel()
+    await asyncio.gather(*_running, return_exceptions=True)
+
+
+async def _update_status(job_id: str, chunk: Optional[str] = None, **fields):
+    """Append `chunk` (if any) and update the status hash in one round trip, refreshing the TTL."""
+    fields["updated_at"] = int(time.time())
+    async with redis_pipeline() as pipe:
+        if chunk is not None:
+            pipe.rpush(_key(job_id, "results"), chunk)
+            pipe.expire(_key(job_id, "results"), LOAD_JOB_TTL)
+        pipe.hset(_key(job_id, "status"), mapping=fields)
+        pipe.expire(_key(job_id, "status"), LOAD_JOB_TTL)
+        await pipe.execute()
+
+
+def _dump(items: list) -> str:
+    return json.dumps([item.to_dict() for item in items])
+
+
+async def run_load_job(job_id: str):
+    """Run one job to completion, recording progress and results in Redis."""
+    params = await consume_key_redis(_key(job_id, "params"))
+    if params is None:
+        # Expired before a worker got to it, or already picked up elsewhere
+        return
+    params = json.loads(params)
+    provider = params["provider"]
+
+    progress = {"pages": 0}
+
+    def page_done(_items: int):
+        progress["pages"] += 1
+
+    token = page_listener.set(page_done)
+    items = _iter_items(params)
+    complete = is_complete_load(
+        params.get("sync_mode", "full"),
+        params.get("return_delta", False),
+        params.get("max_pages"),
+        params.get("max_items"),
+    )
+    # A complete load also becomes the provider's item snapshot (see snapshots.py),
+    # encoded a chunk at a time so the job never holds more than one chunk of items
+    snapshot = SnapshotBuilder(provider, params["credentials"]) if complete else None
+    buffer = []
+    total = chunks = reported_pages = 0
+    try:
+        with span("load_job", provider=provider, job_id=job_id, sync_mode=params.get("sync_mode")) as current:
+            await _update_status(job_id, state="running", started_at=int(time.time()))
+            async for item in items:
+                buffer.append(item)
+                total += 1
+                if len(buffer) >= LOAD_JOB_CHUNK_SIZE:
+                    chunks += 1
+                    reported_pages = progress["pages"]
+                    await _update_status(
+                        job_id, _dump(buffer), pages=reported_pages, items=total, chunks=chunks
+                    )
+                    if snapshot is not None:
+                        await snapshot.add(buffer)
+                    buffer = []
+                elif progress["pages"] != reported_pages:
+                    # A new page came in but no chunk is due yet: report progress alone
+                    reported_pages = progress["pages"]
+                    await _update_status(job_id, pages=reported_pages)
+            if buffer:
+                chunks += 1
+            if snapshot is not None:
+                await snapshot.add(buffer)
+                await snapshot.store()
+            await _update_status(
+                job_id,
+                _dump(buffer) if buffer else None,
+                state="done",
+                pages=progress["pages"],
+                items=total,
+                chunks=chunks,
+                finished_at=int(time.time()),
+            )
+            current.set_attributes(items=total, pages=progress["pages"])
+        LOAD_JOBS.labels(provider, "done").inc()
+        ITEMS_PER_LOAD.labels(provider).observe(total)
+    except asyncio.CancelledError:
+        await _fail(job_id, provider, "Job was interrupted by a worker shutdown, please start it again.")
+        raise
+    except HTTPException as exc:
+        await _fail(job_id, provider, str(exc.detail), exc.status_code)
+    except Exception:
+        logger.exception("Load job %s failed", job_id)
+        await _fail(job_id, provider, "Internal error while loading.")
+    finally:
+        page_listener.reset(token)
+        await items.aclose()
+
+
+async def _fail(job_id: str, provider: str, error: str, status_code: int = 500):
+    LOAD_JOBS.labels(provider, "failed").inc()
+    log_event(logger, logging.WARNING, "Load job failed", job_id=job_id, provider=provider, error=error)
+    await _update_status(
+        job_id, state="failed", error=error, status_code=status_code, finished_at=int(time.time())
+    )
+
+
+def _decode(status: dict) -> dict:
+    decoded = {key.decode("utf-8"): value.decode("utf-8") for key, value in status.items()}
+    for field in ("pages", "items", "chunks", "status_code", "created_at", "updated_at", "started_at", "finished_at"):
+        if field in decoded:
+            decoded[field] = int(decoded[field])
+    return decoded
+
+
+async def get_load_job_status(job_id: str) -> dict:
+    status = await get_hash_redis(_key(job_id, "status"))
+    if not status:
+        raise HTTPException(status_code=404, detail="Unknown or expired job.")
+    return _decode(status)
+
+
+async def get_load_job_results(job_id: str, cursor: int = 0, chunks: int = 1) -> bytes:
+    """
+    A JSON page of results: up to `chunks` stored chunks from `cursor` on.
+    `next_cursor` is where to continue; it is null once a finished job has
+    nothing left. While the job runs, an empty page means "poll again".
+    """
+    if cursor < 0 or chunks < 1:
+        raise HTTPException(status_code=400, detail="cursor must be >= 0 and chunks >= 1.")
+    # Status first: a job seen as done has already written all of its chunks
+    status = await get_load_job_status(job_id)
+    stored = await get_list_range_redis(_key(job_id, "results"), cursor, cursor + chunks - 1)
+    next_cursor = cursor + len(stored)
+    if status["state"] in ("done", "failed") and next_cursor >= status["chunks"]:
+        next_cursor = None
+    meta = {
+        "job_id": job_id,
+        "state": status["state"],
+        "cursor": cursor,
+        "next_cursor": next_cursor,
+    }
+    # Chunks are stored as JSON arrays already: splice them in rather than
+    # decoding and re-encoding every item
+    items = b",".join(chunk[1:-1] for chunk in stored if len(chunk) > 2)
+    return json.dumps(meta)[:-1].encode("utf-8") + b', "items": [' + items + b"]}"
+
+
+# External worker pool
+
+async def _worker_loop(concurrency: int):
+    await init_http_clients()
+    # Same as the API workers: keep the HubSpot credentials cache coherent
+    listener = asyncio.ensure_future(listen_for_credential_invalidations())
+    slots = asyncio.Semaphore(concurrency)
+    running = set()
+    try:
+        while True:
+            await slots.acquire()
+            job_id = await blocking_pop_redis(LOAD_JOB_QUEUE, QUEUE_POLL_SECONDS)
+            if job_id is None:
+                slots.release()
+                continue
+            task = asyncio.ensure_future(run_load_job(job_id.decode("utf-8")))
+            running.add(task)
+            task.add_done_callback(running.discard)
+            task.add_done_callback(lambda _: slots.release())
+    finally:
+        listener.cancel()
+        for task in list(running):
+            task.cancel()
+        await asyncio.gather(listener, *running, return_exceptions=True)
+        await close_http_clients()
+
+
+def _run_worker(concurrency: int):
+    configure_logging()
+    log_event(logger, logging.INFO, "Load job worker started", pid=os.getpid(), concurrency=concurrency)
+    try:
+        asyncio.run(_worker_loop(concurrency))
+    except KeyboardInterrupt:
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Run background load jobs queued by the API (LOAD_JOB_WORKERS=external).")
+    parser.add_argument("--processes", type=int, default=1)
+    parser.add_argument("--concurrency", type=int, default=LOAD_JOB_CONCURRENCY, help="jobs per process at once")
+    args = parser.parse_args()
+
+    if args.processes == 1:
+        _run_worker(args.concurrency)
+        return
+    workers = [
+        multiprocessing.Process(target=_run_worker, args=(args.concurrency,), daemon=False)
+        for _ in range(args.processes)
+    ]
+    for worker in workers:
+        worker.start()
+    try:
+        for worker in workers:
+            worker.join()
+    except KeyboardInterrupt:
+        for worker in workers:
+            worker.join()
+
+
+if __name__ == "__main__":
+    main()
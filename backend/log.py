@@ -0,0 +1,63 @@
+import os
+import json
+import random
+import logging
+
+# Structured logging for the backend. LOG_FORMAT=json emits one JSON object
+# per line (with any `fields` passed along), anything else plain text.
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+# Share of hot-path messages (one per load, ...) that are actually emitted
+LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", "0.01"))
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+            **getattr(record, "fields", {}),
+        }
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        message = super().format(record)
+        fields = getattr(record, "fields", None)
+        if fields:
+            message += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return message
+
+
+def configure_logging():
+    handler = logging.StreamHandler()
+    if LOG_FORMAT == "json":
+        handler.setFormatter(JsonFormatter())
+    else:
+        handler.setFormatter(TextFormatter("%(asctime)s %(levelname)s [%(name)s] %(message)s"))
+    root = logging.getLogger()
+    root.handlers = [handler]
+    root.setLevel(LOG_LEVEL)
+    # httpx logs every upstream request at INFO, far too chatty for the hot path
+    logging.getLogger("httpx").setLevel(max(logging.WARNING, root.level))
+
+
+def log_event(logger: logging.Logger, level: int, message: str, **fields):
+    """Log `message` with structured `fields` attached."""
+    if logger.isEnabledFor(level):
+        logger.log(level, message, extra={"fields": fields})
+
+
+def log_sampled(logger: logging.Logger, level: int, message: str, rate: float = None, **fields):
+    """
+    Like log_event, but only for a `rate` share of calls (LOG_SAMPLE_RATE by
+    default). For per-request messages that would flood the logs under load.
+    """
+    rate = LOG_SAMPLE_RATE if rate is None else rate
+    if rate >= 1 or random.random() < rate:
+        log_event(logger, level, message, sample_rate=rate, **fields)
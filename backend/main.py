@@ -1,17 +1,27 @@
 import os
 import json
+import time
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Optional
 from fastapi import FastAPI, Form, Request, HTTPException
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse, Response
+from starlette.background import BackgroundTask
 
 from integrations.airtable import (
     authorize_airtable,
     get_items_airtable,
+    iter_items_airtable,
+    invalidate_airtable_metadata,
     oauth2callback_airtable,
     get_airtable_credentials
 )
 from integrations.notion import (
     authorize_notion,
     get_items_notion,
+    iter_items_notion,
+    iter_items_notion_incremental,
     oauth2callback_notion,
     get_notion_credentials
 )
@@ -19,14 +29,60 @@ from integrations.hubspot import (
     authorize_hubspot,
     get_hubspot_credentials,
     get_items_hubspot,
+    iter_items_hubspot,
+    iter_items_hubspot_incremental,
     oauth2callback_hubspot,
     get_contact,
     create_contact,
     update_contact,
-    delete_contact
+    delete_contact,
+    batch_create_contacts,
+    batch_update_contacts,
+    batch_read_contacts,
+    batch_archive_contacts,
+    listen_for_credential_invalidations
 )
+from integrations.hubspot_refresher import run_token_refresher
+from http_client import PROVIDERS, init_http_clients, close_http_clients
+from responses import items_response, wants_ndjson, ndjson_response
+from redis_client import get_redis_pool_stats
+from rate_limiter import get_scheduler_stats
+from metrics import HTTP_REQUEST_DURATION, render_metrics
+from log import configure_logging
+from tracing import mark_error, request_span, shutdown_tracing
+from snapshots import get_item_snapshot_page, is_complete_load, store_item_snapshot, with_snapshot
+from jobs import (
+    cancel_in_process_jobs,
+    enqueue_load_job,
+    get_load_job_results,
+    get_load_job_status,
+)
+
+configure_logging()
+
+# Keep each worker's in-process credentials cache coherent via Redis pub/sub
+CREDENTIALS_CACHE_PUBSUB = os.getenv("CREDENTIALS_CACHE_PUBSUB", "true").lower() in ("1", "true", "yes")
+# Refresh HubSpot tokens in the background, shortly before they expire
+HUBSPOT_TOKEN_REFRESHER = os.getenv("HUBSPOT_TOKEN_REFRESHER", "true").lower() in ("1", "true", "yes")
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Pooled provider HTTP clients live for the whole app lifetime
+    await init_http_clients()
+    background_tasks = []
+    if CREDENTIALS_CACHE_PUBSUB:
+        background_tasks.append(asyncio.create_task(listen_for_credential_invalidations()))
+    if HUBSPOT_TOKEN_REFRESHER:
+        background_tasks.append(asyncio.create_task(run_token_refresher()))
+    yield
+    await cancel_in_process_jobs()
+    for task in background_tasks:
+        task.cancel()
+    await asyncio.gather(*background_tasks, return_exceptions=True)
+    await close_http_clients()
+    shutdown_tracing()
+
+app = FastAPI(lifespan=lifespan)
 
 # For production environments
 # TO DO: configure these in ENV or other config
@@ -40,10 +96,116 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def record_request_metrics(request: Request, call_next):
+    start = time.perf_counter()
+    status = 500
+    # /integrations/<provider>/... ; org/user are added further down via tag_request
+    parts = request.url.path.split("/")
+    provider = parts[2] if len(parts) > 2 and parts[1] == "integrations" else None
+    with request_span(request.method, provider=provider, **{"http.method": request.method}) as current:
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            # The route template, not the raw path, so label values stay bounded
+            route = request.scope.get("route")
+            route_path = route.path if route is not None else "unmatched"
+            HTTP_REQUEST_DURATION.labels(
+                route_path, request.method, str(status)
+            ).observe(time.perf_counter() - start)
+            current.rename(f"{request.method} {route_path}")
+            current.set_attributes(**{"http.route": route_path, "http.status_code": status})
+            if status >= 500:
+                mark_error(current, status)
+
 @app.get("/")
 def read_root():
     return {"Ping": "Pong"}
 
+@app.get("/redis/pool")
+def redis_pool_stats():
+    """
+    Redis connection pool saturation and wait times for this worker.
+    """
+    return get_redis_pool_stats()
+
+@app.get("/rate-limits")
+def rate_limit_stats():
+    """
+    Per-provider request, 429 and retry counters plus the current queue depth.
+    """
+    return get_scheduler_stats()
+
+@app.get("/metrics")
+def metrics():
+    """
+    Prometheus metrics for this worker (or all workers, in multiprocess mode).
+    """
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+# -----------------------
+# Item snapshots
+# -----------------------
+def load_response(provider: str, credentials: str, items: list, complete: bool = True):
+    """
+    items_response for a load; a complete one is also stored as the item
+    snapshot /integrations/<provider>/items serves from, once the response is sent.
+    """
+    response = items_response(items, provider)
+    if complete:
+        response.background = BackgroundTask(store_item_snapshot, provider, credentials, items)
+    return response
+
+async def load_stream(provider: str, credentials: str, items, complete: bool = True):
+    """ndjson_response for a load; a complete one is stored as the item snapshot as it streams."""
+    if complete:
+        items = with_snapshot(provider, credentials, items)
+    return await ndjson_response(items, provider)
+
+@app.post("/integrations/{provider}/items")
+async def get_snapshot_items(
+    provider: str,
+    credentials: str = Form(...),
+    offset: int = Form(0),
+    limit: int = Form(100),
+    type: Optional[str] = Form(None),
+    parent_id: Optional[str] = Form(None),
+):
+    """
+    Page through the items of the last complete load without calling the
+    provider again, optionally only those of one `type` or under one `parent_id`.
+    `credentials` is the same form field the load was made with. The response
+    also reports the snapshot's size, build time and how long this read took.
+    """
+    if provider not in PROVIDERS:
+        raise HTTPException(status_code=404, detail=f"Unknown provider '{provider}'.")
+    return await get_item_snapshot_page(provider, credentials, offset, limit, type, parent_id)
+
+# -----------------------
+# Background load jobs
+# -----------------------
+async def start_load_job(provider: str, credentials: str, **options) -> JSONResponse:
+    return JSONResponse(await enqueue_load_job(provider, credentials, **options), status_code=202)
+
+@app.get("/jobs/{job_id}")
+async def load_job_status(job_id: str):
+    """
+    Progress of a load started with `job=true`: state (queued, running, done,
+    failed), pages and items loaded so far, and the error if it failed.
+    """
+    return await get_load_job_status(job_id)
+
+@app.get("/jobs/{job_id}/results")
+async def load_job_results(job_id: str, cursor: int = 0, chunks: int = 1):
+    """
+    Items a job has stored so far, `chunks` chunks from `cursor` on. Keep
+    following `next_cursor` until it is null.
+    """
+    return Response(content=await get_load_job_results(job_id, cursor, chunks), media_type="application/json")
+
 # -----------------------
 # Airtable
 # -----------------------
@@ -66,12 +228,29 @@ async def get_airtable_credentials_integration(
     return await get_airtable_credentials(user_id, org_id)
 
 @app.post("/integrations/airtable/load")
-async def get_airtable_items(credentials: str = Form(...)):
+async def get_airtable_items(request: Request, credentials: str = Form(...), job: bool = Form(False)):
     """
     Called by the frontend to load Airtable data,
     passing raw JSON credentials in the 'credentials' form field.
+    Send `Accept: application/x-ndjson` to stream items as they are loaded,
+    or `job=true` to run the load in the background (see /jobs).
     """
-    return await get_items_airtable(credentials)
+    if job:
+        return await start_load_job("airtable", credentials)
+    if wants_ndjson(request):
+        return await load_stream("airtable", credentials, iter_items_airtable(credentials))
+    return load_response("airtable", credentials, await get_items_airtable(credentials))
+
+@app.post("/integrations/airtable/cache/invalidate")
+async def invalidate_airtable_cache(
+    credentials: str = Form(...),
+    base_id: Optional[str] = Form(None),
+):
+    """
+    Drop cached Airtable schema metadata, e.g. right after a base or table was
+    changed. With `base_id` only that base's tables are dropped.
+    """
+    return await invalidate_airtable_metadata(credentials, base_id)
 
 # -----------------------
 # Notion
@@ -95,8 +274,32 @@ async def get_notion_credentials_integration(
     return await get_notion_credentials(user_id, org_id)
 
 @app.post("/integrations/notion/load")
-async def get_notion_items(credentials: str = Form(...)):
-    return await get_items_notion(credentials)
+async def get_notion_items(
+    request: Request,
+    credentials: str = Form(...),
+    sync_mode: str = Form("full"),
+    return_delta: bool = Form(False),
+    job: bool = Form(False),
+):
+    if sync_mode not in ("full", "incremental"):
+        raise HTTPException(status_code=400, detail="sync_mode must be 'full' or 'incremental'.")
+    if job:
+        return await start_load_job("notion", credentials, sync_mode=sync_mode, return_delta=return_delta)
+    if wants_ndjson(request):
+        if sync_mode == "incremental":
+            return await load_stream(
+                "notion",
+                credentials,
+                iter_items_notion_incremental(credentials, return_delta),
+                is_complete_load(sync_mode, return_delta),
+            )
+        return await load_stream("notion", credentials, iter_items_notion(credentials))
+    return load_response(
+        "notion",
+        credentials,
+        await get_items_notion(credentials, sync_mode, return_delta),
+        is_complete_load(sync_mode, return_delta),
+    )
 
 # -----------------------
 # HubSpot
@@ -127,12 +330,61 @@ async def get_hubspot_credentials_integration(
     return await get_hubspot_credentials(user_id, org_id)
 
 @app.post("/integrations/hubspot/load")
-async def load_hubspot_data_integration(credentials: str = Form(...)):
+async def load_hubspot_data_integration(
+    request: Request,
+    credentials: str = Form(...),
+    max_pages: Optional[int] = Form(None, ge=1),
+    max_items: Optional[int] = Form(None, ge=1),
+    sync_mode: str = Form("full"),
+    return_delta: bool = Form(False),
+    job: bool = Form(False),
+):
     """
     Expects a JSON string with at least: "user_id" and "org_id".
     Then calls get_items_hubspot, which auto-refreshes if needed.
+    `max_pages` / `max_items` optionally cap how much is loaded (full mode only).
+    `sync_mode=incremental` only fetches contacts changed since the last load and
+    returns the merged snapshot, or just the changes with `return_delta=true`.
+    Send `Accept: application/x-ndjson` to stream items as they are loaded,
+    or `job=true` to run the load in the background and poll /jobs/<job_id>.
     """
-    return await get_items_hubspot(credentials)
+    if sync_mode not in ("full", "incremental"):
+        raise HTTPException(status_code=400, detail="sync_mode must be 'full' or 'incremental'.")
+    if job:
+        return await start_load_job(
+            "hubspot",
+            credentials,
+            max_pages=max_pages,
+            max_items=max_items,
+            sync_mode=sync_mode,
+            return_delta=return_delta,
+        )
+    if wants_ndjson(request):
+        if sync_mode == "incremental":
+            return await load_stream(
+                "hubspot",
+                credentials,
+                iter_items_hubspot_incremental(credentials, return_delta),
+                is_complete_load(sync_mode, return_delta),
+            )
+        return await load_stream(
+            "hubspot",
+            credentials,
+            iter_items_hubspot(credentials, max_pages=max_pages, max_items=max_items),
+            is_complete_load(sync_mode, return_delta, max_pages, max_items),
+        )
+    return load_response(
+        "hubspot",
+        credentials,
+        await get_items_hubspot(
+            credentials,
+            max_pages=max_pages,
+            max_items=max_items,
+            sync_mode=sync_mode,
+            return_delta=return_delta,
+        ),
+        is_complete_load(sync_mode, return_delta, max_pages, max_items),
+    )
 
 @app.post("/integrations/hubspot/contact/get")
 async def hubspot_get_contact(
@@ -190,4 +442,81 @@ async def hubspot_delete_contact(
     """
     Delete the HubSpot contact with the given contact_id.
     """
-    return await delete_contact(org_id, user_id, contact_id)
\ No newline at end of file
+    return await delete_contact(org_id, user_id, contact_id)
+
+def parse_json_list(value: str, field: str) -> list:
+    """
+    Decode a JSON array sent in the form field `field`, or raise a 400.
+    """
+    try:
+        parsed = json.loads(value)
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid JSON in '{field}'.")
+    if not isinstance(parsed, list):
+        raise HTTPException(status_code=400, detail=f"'{field}' must be a JSON list.")
+    return parsed
+
+@app.post("/integrations/hubspot/contacts/batch/create")
+async def hubspot_batch_create_contacts(
+    user_id: str = Form(...),
+    org_id: str = Form(...),
+    properties_list_str: str = Form(...),
+):
+    """
+    Create many contacts at once.
+    `properties_list_str` is a JSON list of property objects, e.g.:
+       [{"email": "jonedoe@hubspot.com", "firstname": "Jone"}, ...]
+    """
+    properties_list = parse_json_list(properties_list_str, "properties_list_str")
+    if not all(isinstance(properties, dict) for properties in properties_list):
+        raise HTTPException(status_code=400, detail="Every entry in 'properties_list_str' must be an object.")
+
+    return await batch_create_contacts(org_id, user_id, properties_list)
+
+@app.post("/integrations/hubspot/contacts/batch/update")
+async def hubspot_batch_update_contacts(
+    user_id: str = Form(...),
+    org_id: str = Form(...),
+    inputs_str: str = Form(...),
+):
+    """
+    Update many contacts at once.
+    `inputs_str` is a JSON list like:
+       [{"id": "123", "properties": {"firstname": "NewName"}}, ...]
+    """
+    updates = parse_json_list(inputs_str, "inputs_str")
+    if not all(isinstance(update, dict) and update.get("id") for update in updates):
+        raise HTTPException(status_code=400, detail="Every entry in 'inputs_str' needs an 'id'.")
+
+    return await batch_update_contacts(org_id, user_id, updates)
+
+@app.post("/integrations/hubspot/contacts/batch/read")
+async def hubspot_batch_read_contacts(
+    user_id: str = Form(...),
+    org_id: str = Form(...),
+    ids_str: str = Form(...),
+    properties_str: Optional[str] = Form(None),
+):
+    """
+    Read many contacts by ID.
+    `ids_str` is a JSON list of contact IDs, `properties_str` an optional
+    JSON list of property names to return.
+    """
+    contact_ids = parse_json_list(ids_str, "ids_str")
+    properties = parse_json_list(properties_str, "properties_str") if properties_str else None
+
+    return await batch_read_contacts(org_id, user_id, contact_ids, properties)
+
+@app.post("/integrations/hubspot/contacts/batch/archive")
+async def hubspot_batch_archive_contacts(
+    user_id: str = Form(...),
+    org_id: str = Form(...),
+    ids_str: str = Form(...),
+):
+    """
+    Archive (delete) many contacts by ID.
+    `ids_str` is a JSON list of contact IDs.
+    """
+    contact_ids = parse_json_list(ids_str, "ids_str")
+
+    return await batch_archive_contacts(org_id, user_id, contact_ids)
@@ -0,0 +1,143 @@
+import os
+import time
+import functools
+from typing import Dict
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST,
+    CollectorRegistry,
+    Counter,
+    Histogram,
+    REGISTRY,
+    generate_latest,
+)
+from prometheus_client.core import CounterMetricFamily, GaugeMetricFamily
+
+# Prometheus metrics for the backend, served at GET /metrics.
+# With several uvicorn workers set PROMETHEUS_MULTIPROC_DIR so every worker's
+# samples are aggregated (see prometheus_client's multiprocess mode).
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "Time to handle a request, until the response headers are sent",
+    ["route", "method", "status"],
+)
+UPSTREAM_REQUEST_DURATION = Histogram(
+    "upstream_request_duration_seconds",
+    "Latency of single requests to a provider API (each retry counted separately)",
+    ["provider", "method"],
+)
+UPSTREAM_REQUESTS = Counter(
+    "upstream_requests_total",
+    "Requests sent to a provider API, by response status",
+    ["provider", "status"],
+)
+TOKEN_REFRESHES = Counter(
+    "token_refreshes_total",
+    "HubSpot token refreshes by outcome (refreshed, failed, deduplicated)",
+    ["outcome"],
+)
+TOKEN_REFRESH_DURATION = Histogram(
+    "token_refresh_duration_seconds",
+    "Time to refresh a HubSpot token, lock wait included",
+)
+REDIS_OP_DURATION = Histogram(
+    "redis_op_duration_seconds",
+    "Latency of the redis_client helpers",
+    ["op"],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5),
+)
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total",
+    "Lookups in Redis-backed caches, by result",
+    ["cache", "result"],
+)
+ITEMS_PER_LOAD = Histogram(
+    "items_per_load",
+    "IntegrationItems returned by one /load request",
+    ["provider"],
+    buckets=(0, 10, 50, 100, 500, 1000, 5000, 10000, 50000, 100000),
+)
+LOAD_JOBS = Counter(
+    "load_jobs_total",
+    "Background load jobs by outcome (queued, done, failed)",
+    ["provider", "outcome"],
+)
+SNAPSHOT_BUILD_DURATION = Histogram(
+    "item_snapshot_build_seconds",
+    "Time to encode and compress an item snapshot",
+    ["provider"],
+)
+SNAPSHOT_BYTES = Histogram(
+    "item_snapshot_bytes",
+    "Compressed size of stored item snapshots",
+    ["provider"],
+    buckets=(1e3, 1e4, 5e4, 1e5, 5e5, 1e6, 5e6, 1e7, 5e7),
+)
+SNAPSHOT_RETRIEVAL_DURATION = Histogram(
+    "item_snapshot_retrieval_seconds",
+    "Time to serve a page from an item snapshot, by where it was decoded from",
+    ["provider", "source"],
+    buckets=(.0005, .001, .0025, .005, .01, .025, .05, .1, .25, .5, 1),
+)
+
+
+def redis_op(name: str):
+    """Decorator timing a redis_client helper coroutine into REDIS_OP_DURATION."""
+    histogram = REDIS_OP_DURATION.labels(name)
+
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            start = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                histogram.observe(time.perf_counter() - start)
+        return wrapper
+    return decorator
+
+
+class _LocalCacheCollector:
+    """
+    Exposes the hit/miss counters every in-process LRUCache already keeps,
+    read at scrape time so cache lookups themselves stay uninstrumented.
+    """
+
+    def __init__(self):
+        self.caches: Dict[str, object] = {}
+
+    def collect(self):
+        hits = CounterMetricFamily("local_cache_hits", "In-process cache hits", labels=["cache"])
+        misses = CounterMetricFamily("local_cache_misses", "In-process cache misses", labels=["cache"])
+        size = GaugeMetricFamily("local_cache_size", "Entries in an in-process cache", labels=["cache"])
+        for name, cache in self.caches.items():
+            stats = cache.stats()
+            hits.add_metric([name], stats["hits"])
+            misses.add_metric([name], stats["misses"])
+            size.add_metric([name], stats["size"])
+        yield hits
+        yield misses
+        yield size
+
+
+_local_caches = _LocalCacheCollector()
+REGISTRY.register(_local_caches)
+
+
+def register_local_cache(name: str, cache):
+    """Report `cache` (an LRUCache) under `name`."""
+    _local_caches.caches[name] = cache
+
+
+def render_metrics():
+    """(body, content type) for the /metrics endpoint."""
+    if os.getenv("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        # In-process caches live outside the multiprocess files: report this worker's
+        registry.register(_local_caches)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
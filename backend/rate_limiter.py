@@ -0,0 +1,200 @@
+import os
+import time
+import random
+import asyncio
+from email.utils import parsedate_to_datetime
+from typing import Dict, Optional, Tuple
+
+import httpx
+from fastapi import HTTPException
+
+from fingerprint import token_fingerprint
+from http_client import get_http_client
+from local_cache import LRUCache
+from metrics import UPSTREAM_REQUEST_DURATION, UPSTREAM_REQUESTS
+from tracing import mark_error, span
+
+
+def _parse_limit(value: str) -> Tuple[int, float]:
+    """'100/10' -> 100 requests per 10 seconds."""
+    count, _, period = value.partition("/")
+    return int(count), float(period or 1)
+
+
+# Published per-token limits, overridable as "<requests>/<seconds>":
+#   HubSpot OAuth apps: 110 requests per 10s per account (kept slightly below)
+#   Airtable: 5 requests per second per base
+#   Notion: an average of 3 requests per second per integration
+PROVIDER_LIMITS: Dict[str, Tuple[int, float]] = {
+    "hubspot": _parse_limit(os.getenv("RATE_LIMIT_HUBSPOT", "100/10")),
+    "airtable": _parse_limit(os.getenv("RATE_LIMIT_AIRTABLE", "5/1")),
+    "notion": _parse_limit(os.getenv("RATE_LIMIT_NOTION", "3/1")),
+}
+RATE_LIMIT_MAX_RETRIES = int(os.getenv("RATE_LIMIT_MAX_RETRIES", "4"))
+RATE_LIMIT_BACKOFF_BASE = float(os.getenv("RATE_LIMIT_BACKOFF_BASE", "0.5"))
+RATE_LIMIT_BACKOFF_MAX = float(os.getenv("RATE_LIMIT_BACKOFF_MAX", "30"))
+# Buckets nobody used for this long are dropped
+BUCKET_IDLE_SECONDS = 3600
+
+
+class TokenBucket:
+    """
+    Classic token bucket: `capacity` requests per `period` seconds, refilled
+    continuously. A 429 pauses the whole bucket for the Retry-After window.
+    """
+
+    def __init__(self, capacity: int, period: float):
+        self.capacity = capacity
+        self.rate = capacity / period
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.waiting = 0
+
+    def _refill(self, now: float):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        self.waiting += 1
+        try:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now >= self.paused_until and self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                wait = max(self.paused_until - now, (1 - self.tokens) / self.rate)
+                await asyncio.sleep(wait)
+        finally:
+            self.waiting -= 1
+
+    def pause(self, seconds: float):
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+        self.tokens = 0.0
+
+
+_buckets = LRUCache(max_size=50000)
+# "failures" counts errors callers chose to degrade gracefully on (see record_failure)
+STATS = {provider: {"requests": 0, "throttled": 0, "retries": 0, "failures": 0} for provider in PROVIDER_LIMITS}
+
+
+def _get_bucket(provider: str, limit_key: str, scope: Optional[str]) -> TokenBucket:
+    key = (provider, token_fingerprint(limit_key), scope)
+    bucket = _buckets.get(key)
+    if bucket is None:
+        bucket = TokenBucket(*PROVIDER_LIMITS[provider])
+    _buckets.set(key, bucket, time.time() + BUCKET_IDLE_SECONDS)
+    return bucket
+
+
+def _retry_delay(response: httpx.Response, attempt: int) -> float:
+    """
+    Honor Retry-After (seconds or HTTP date) when present, otherwise use
+    exponential backoff with full jitter.
+    """
+    retry_after = response.headers.get("Retry-After")
+    if retry_after:
+        try:
+            delay = float(retry_after)
+        except ValueError:
+            try:
+                delay = parsedate_to_datetime(retry_after).timestamp() - time.time()
+            except (TypeError, ValueError):
+                delay = None
+        if delay is not None:
+            return max(0.0, delay) + random.uniform(0, RATE_LIMIT_BACKOFF_BASE)
+    return random.uniform(0, min(RATE_LIMIT_BACKOFF_MAX, RATE_LIMIT_BACKOFF_BASE * 2 ** attempt))
+
+
+async def send_request(
+    provider: str,
+    method: str,
+    url: str,
+    limit_key: str,
+    scope: Optional[str] = None,
+    **kwargs,
+) -> httpx.Response:
+    """
+    Send a request through the provider's shared client, paced by the token
+    bucket for (`provider`, `limit_key`, `scope`). `limit_key` is normally the
+    access token, `scope` narrows it further (e.g. an Airtable base id).
+    429 responses are retried up to RATE_LIMIT_MAX_RETRIES times; the last
+    response is returned as-is so callers keep their own error handling.
+    """
+    bucket = _get_bucket(provider, limit_key, scope)
+    client = get_http_client(provider)
+    stats = STATS[provider]
+
+    # One client span per call, bucket waits and 429 retries included
+    with span(
+        f"{provider} {method}",
+        kind="client",
+        provider=provider,
+        **{"http.method": method, "http.url": url.split("?", 1)[0]},
+    ) as current:
+        attempt = 0
+        while True:
+            await bucket.acquire()
+            stats["requests"] += 1
+            start = time.perf_counter()
+            try:
+                response = await client.request(method, url, **kwargs)
+            except httpx.HTTPError:
+                UPSTREAM_REQUESTS.labels(provider, "error").inc()
+                raise
+            finally:
+                UPSTREAM_REQUEST_DURATION.labels(provider, method).observe(time.perf_counter() - start)
+            UPSTREAM_REQUESTS.labels(provider, str(response.status_code)).inc()
+            current.set_attributes(**{"http.status_code": response.status_code, "retries": attempt})
+            if response.status_code != 429:
+                if response.status_code >= 500:
+                    mark_error(current, response.status_code)
+                return response
+
+            stats["throttled"] += 1
+            if attempt >= RATE_LIMIT_MAX_RETRIES:
+                mark_error(current, response.status_code)
+                return response
+            delay = _retry_delay(response, attempt)
+            bucket.pause(delay)
+            stats["retries"] += 1
+            attempt += 1
+
+
+def raise_for_rate_limit(response: httpx.Response, provider: str):
+    """Turn a 429 that survived every retry into an HTTP 429 for our own caller."""
+    if response.status_code == 429:
+        raise HTTPException(
+            status_code=429,
+            detail=f"{provider} rate limit exceeded, please retry later."
+        )
+
+
+def record_failure(provider: str):
+    """
+    Count a non-429 error response the caller doesn't raise for (e.g. serving
+    stale data instead), so it still shows up in /rate-limits.
+    """
+    STATS[provider]["failures"] += 1
+
+
+def get_scheduler_stats() -> dict:
+    """
+    Per-provider request/retry counters and how many requests are queued
+    waiting for their bucket right now.
+    """
+    queued = {provider: 0 for provider in PROVIDER_LIMITS}
+    buckets = {provider: 0 for provider in PROVIDER_LIMITS}
+    for (provider, _, _), bucket in _buckets.items():
+        queued[provider] += bucket.waiting
+        buckets[provider] += 1
+    return {
+        provider: {
+            **STATS[provider],
+            "queue_depth": queued[provider],
+            "buckets": buckets[provider],
+            "limit": {"requests": PROVIDER_LIMITS[provider][0], "per_seconds": PROVIDER_LIMITS[provider][1]},
+        }
+        for provider in PROVIDER_LIMITS
+    }
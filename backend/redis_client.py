@@ -1,17 +1,282 @@
 import os
+import time
+import functools
 import redis.asyncio as redis
+from redis.asyncio.cluster import RedisCluster
+from redis.asyncio.sentinel import Sentinel
 from kombu.utils.url import safequote
 
+from metrics import redis_op
+from tracing import traced
+
+# standalone | cluster | sentinel
+REDIS_MODE = os.environ.get('REDIS_MODE', 'standalone').lower()
 redis_host = safequote(os.environ.get('REDIS_HOST', 'localhost'))
-redis_client = redis.Redis(host=redis_host, port=6379, db=0)
+redis_port = int(os.environ.get('REDIS_PORT', '6379'))
+redis_db = int(os.environ.get('REDIS_DB', '0'))
+redis_password = os.environ.get('REDIS_PASSWORD') or None
+
+# Pool sizing is per worker process
+REDIS_MAX_CONNECTIONS = int(os.environ.get('REDIS_MAX_CONNECTIONS', '50'))
+# How long a command waits for a free pooled connection before erroring
+REDIS_POOL_TIMEOUT = float(os.environ.get('REDIS_POOL_TIMEOUT', '5'))
+REDIS_SOCKET_TIMEOUT = float(os.environ.get('REDIS_SOCKET_TIMEOUT', '5'))
+REDIS_SOCKET_CONNECT_TIMEOUT = float(os.environ.get('REDIS_SOCKET_CONNECT_TIMEOUT', '5'))
+REDIS_HEALTH_CHECK_INTERVAL = int(os.environ.get('REDIS_HEALTH_CHECK_INTERVAL', '30'))
+
+# Sentinel mode: comma separated "host:port" list and the monitored service name
+REDIS_SENTINELS = os.environ.get('REDIS_SENTINELS', '')
+REDIS_SENTINEL_SERVICE = os.environ.get('REDIS_SENTINEL_SERVICE', 'mymaster')
+
+# Tagged on every helper's span, when tracing is on
+REDIS_SPAN_ATTRIBUTES = {'db.system': 'redis', 'redis.mode': REDIS_MODE}
+
+
+class InstrumentedConnectionPool(redis.BlockingConnectionPool):
+    """
+    BlockingConnectionPool that records how long callers waited for a
+    connection, so pool saturation shows up before requests start failing.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.checkouts = 0
+        self.wait_seconds_total = 0.0
+        self.wait_seconds_max = 0.0
+
+    async def get_connection(self, command_name, *keys, **options):
+        start = time.perf_counter()
+        try:
+            return await super().get_connection(command_name, *keys, **options)
+        finally:
+            waited = time.perf_counter() - start
+            self.checkouts += 1
+            self.wait_seconds_total += waited
+            self.wait_seconds_max = max(self.wait_seconds_max, waited)
+
 
+def _connection_options():
+    return {
+        'password': redis_password,
+        'socket_timeout': REDIS_SOCKET_TIMEOUT,
+        'socket_connect_timeout': REDIS_SOCKET_CONNECT_TIMEOUT,
+        'health_check_interval': REDIS_HEALTH_CHECK_INTERVAL,
+    }
+
+
+def _build_redis_client():
+    if REDIS_MODE == 'cluster':
+        # Cluster mode has no logical databases and manages one pool per node
+        return RedisCluster(
+            host=redis_host,
+            port=redis_port,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            **_connection_options(),
+        )
+    if REDIS_MODE == 'sentinel':
+        sentinels = [
+            (host.strip(), int(port))
+            for host, _, port in (entry.partition(':') for entry in REDIS_SENTINELS.split(',') if entry.strip())
+        ]
+        sentinel = Sentinel(
+            sentinels,
+            socket_timeout=REDIS_SOCKET_TIMEOUT,
+            socket_connect_timeout=REDIS_SOCKET_CONNECT_TIMEOUT,
+            sentinel_kwargs={'password': redis_password},
+        )
+        return sentinel.master_for(
+            REDIS_SENTINEL_SERVICE,
+            db=redis_db,
+            max_connections=REDIS_MAX_CONNECTIONS,
+            **_connection_options(),
+        )
+    pool = InstrumentedConnectionPool(
+        host=redis_host,
+        port=redis_port,
+        db=redis_db,
+        max_connections=REDIS_MAX_CONNECTIONS,
+        timeout=REDIS_POOL_TIMEOUT,
+        **_connection_options(),
+    )
+    return redis.Redis(connection_pool=pool)
+
+
+redis_client = _build_redis_client()
+
+
+def get_redis_pool_stats():
+    """
+    Pool saturation and connection wait-time figures for this worker.
+    Wait times are only tracked by the standalone (instrumented) pool.
+    """
+    stats = {'mode': REDIS_MODE, 'max_connections': REDIS_MAX_CONNECTIONS}
+    pool = getattr(redis_client, 'connection_pool', None)
+    if pool is None:
+        # RedisCluster keeps a separate pool per node
+        return stats
+    in_use = len(pool._in_use_connections)
+    stats.update({
+        'in_use_connections': in_use,
+        'idle_connections': len(pool._available_connections),
+        'saturation': in_use / pool.max_connections if pool.max_connections else 0.0,
+    })
+    if isinstance(pool, InstrumentedConnectionPool):
+        stats.update({
+            'checkouts': pool.checkouts,
+            'wait_seconds_avg': pool.wait_seconds_total / pool.checkouts if pool.checkouts else 0.0,
+            'wait_seconds_max': pool.wait_seconds_max,
+        })
+    return stats
+
+@traced('redis.add_key_value', **REDIS_SPAN_ATTRIBUTES)
+@redis_op('add_key_value')
 async def add_key_value_redis(key, value, expire=None):
-    await redis_client.set(key, value)
-    if expire:
-        await redis_client.expire(key, expire)
+    # SET with EX is atomic and a single round trip
+    await redis_client.set(key, value, ex=expire or None)
 
+@traced('redis.get_value', **REDIS_SPAN_ATTRIBUTES)
+@redis_op('get_value')
 async def get_value_redis(key):
     return await redis_client.get(key)
 
+@traced('redis.delete_key', **REDIS_SPAN_ATTRIBUTES)
+@redis_op('delete_key')
 async def delete_key_redis(key):
     await redis_client.delete(key)
+
+@traced('redis.consume_key', **REDIS_SPAN_ATTRIBUTES)
+@redis_op('consume_key')
+async def consume_key_redis(key):
+    """Read and delete `key` in one atomic step (GETDEL), for single-use values."""
+    return await redis_client.getdel(key)
+
+@traced('redis.pipeline', **REDIS_SPAN_ATTRIBUTES)
+@redis_op('pipeline')
+async def _execute_pipeline(pipe, **kwargs):
+    return await type(pipe).execute(pipe, **kwargs)
+
+def redis_pipeline(transaction=True):
+    """
+    Batch several commands into one round trip: queue them, then `await pipe.execute()`.
+    Redis Cluster can't run MULTI across slots, so there it's a plain (non-atomic) pipeline.
+    """
+    if REDIS_MODE == 'cluster':
+        pipe = redis_client.pipeline()
+    else:
+        pipe = redis_client.pipeline(transaction=transaction)
+    # Timed and traced like the helpers, whoever ends up calling execute()
+    pipe.execute = functools.partial(_execute_pipeline, pipe)
+    return pipe
+
+@traced('redis.add_key_values', **REDIS_SPAN_ATTRIBUTES)
+@redis_op('add_key_values')
+async def add_key_values_redis(mapping, expire=None):
+    """SET every key/value in `mapping` (each with the same TTL) in one round trip."""
+    async with redis_pipeline() as pipe:
+        for key, value in mapping.items():
+            pipe.set(key, value, ex=expire or None)
+        await pipe.execute()
+
+@traced('redis.get_values', **REDIS_SPAN_ATTRIBUTES)
+@redis_op('get_values')
+async def get_values_redis(*keys):
+    """GET several keys in one round trip, returned in the same order (None if missing)."""
+    async with redis_pipeline(transaction=False) as pipe:
+        for key in keys:
+            pipe.get(key)
+        return await pipe.execute()
+
+@traced('redis.delete_keys', **REDIS_SPAN_ATTRIBUTES)
+@redis_op('delete_keys')
+async def delete_keys_redis(*keys):
+    if keys:
+        await redis_client.delete(*keys)
+
+@traced('redis.consume_keys', **REDIS_SPAN_ATTRIBUTES)
+@redis_op('consume_keys')
+async def consume_keys_redis(*keys):
+    """GETDEL several keys atomically in one round trip, returned in the same order."""
+    async with redis_pipeline() as pipe:
+        for key in keys:
+            pipe.getdel(key)
+        return await pipe.execute()
+
+def redis_lock(key, timeout, blocking_timeout):
+    """
+    A distributed lock on `key`, shared by every worker talking to this Redis.
+    `timeout` bounds how long it can be held, `blocking_timeout` how long to wait for it.
+    """
+    return redis_client.lock(key, timeout=timeout, blocking_timeout=blocking_timeout)
+
+def pubsub_redis():
+    if REDIS_MODE == 'cluster':
+        # Pub/sub messages are broadcast cluster-wide, so any node can serve them
+        node = redis.Redis(host=redis_host, port=redis_port, **_connection_options())
+        return node.pubsub(ignore_subscribe_messages=True)
+    return redis_client.pubsub(ignore_subscribe_messages=True)
+
+@traced('redis.get_sorted_set_range', **REDIS_SPAN_ATTRIBUTES)
+@redis_op('get_sorted_set_range')
+async def get_sorted_set_range_redis(key, max_score, limit=None):
+    """Members of `key` with a score up to `max_score`, lowest score first."""
+    if limit is None:
+        return await redis_client.zrangebyscore(key, '-inf', max_score)
+    return await redis_client.zrangebyscore(key, '-inf', max_score, start=0, num=limit)
+
+@traced('redis.add_to_sorted_set', **REDIS_SPAN_ATTRIBUTES)
+@redis_op('add_to_sorted_set')
+async def add_to_sorted_set_redis(key, mapping):
+    """ZADD every member -> score in `mapping`."""
+    await redis_client.zadd(key, mapping)
+
+@traced('redis.get_sorted_set_scores', **REDIS_SPAN_ATTRIBUTES)
+@redis_op('get_sorted_set_scores')
+async def get_sorted_set_scores_redis(key, *members):
+    """ZMSCORE: the score of each member, in order (None if absent)."""
+    if not members:
+        return []
+    return await redis_client.zmscore(key, list(members))
+
+@traced('redis.get_hash', **REDIS_SPAN_ATTRIBUTES)
+@redis_op('get_hash')
+async def get_hash_redis(key):
+    """Every field of the hash at `key` (an empty dict if it doesn't exist)."""
+    return await redis_client.hgetall(key)
+
+@traced('redis.get_list_range', **REDIS_SPAN_ATTRIBUTES)
+@redis_op('get_list_range')
+async def get_list_range_redis(key, start, end):
+    """LRANGE: elements `start`..`end` (inclusive) of the list at `key`."""
+    return await redis_client.lrange(key, start, end)
+
+@traced('redis.blocking_pop', **REDIS_SPAN_ATTRIBUTES)
+@redis_op('blocking_pop')
+async def blocking_pop_redis(key, timeout):
+    """
+    BLPOP one element off the list at `key`, waiting up to `timeout` seconds
+    (keep it below REDIS_SOCKET_TIMEOUT). Returns None if nothing arrived.
+    """
+    popped = await redis_client.blpop([key], timeout=timeout)
+    return popped[1] if popped else None
+
+@traced('redis.scan_hash', **REDIS_SPAN_ATTRIBUTES)
+@redis_op('scan_hash')
+async def _scan_hash(key, cursor, count):
+    return await redis_client.hscan(key, cursor, count=count)
+
+async def iter_hash_redis(key, count=500):
+    """HSCAN `key` in batches of about `count`, yielding (field, value) pairs without loading the whole hash."""
+    # Each HSCAN round trip is timed on its own: a span can't stay open across a yield
+    cursor = 0
+    while True:
+        cursor, batch = await _scan_hash(key, cursor, count)
+        for field, value in batch.items():
+            yield field, value
+        if not cursor:
+            break
+
+@traced('redis.delete_hash_fields', **REDIS_SPAN_ATTRIBUTES)
+@redis_op('delete_hash_fields')
+async def delete_hash_fields_redis(key, *fields):
+    if fields:
+        await redis_client.hdel(key, *fields)
@@ -0,0 +1,51 @@
+import json
+from typing import AsyncIterator, Optional
+
+from fastapi import Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+from metrics import ITEMS_PER_LOAD
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+
+
+def items_response(items: list, provider: Optional[str] = None) -> JSONResponse:
+    """Serialize IntegrationItems through their own to_dict(), skipping jsonable_encoder."""
+    if provider is not None:
+        ITEMS_PER_LOAD.labels(provider).observe(len(items))
+    return JSONResponse(content=[item.to_dict() for item in items])
+
+
+def wants_ndjson(request: Request) -> bool:
+    """True when the client opted into streaming via `Accept: application/x-ndjson`."""
+    return NDJSON_MEDIA_TYPE in request.headers.get("accept", "")
+
+
+async def ndjson_response(items: AsyncIterator, provider: Optional[str] = None) -> StreamingResponse:
+    """
+    Stream `items` as newline-delimited JSON, one item per line, as soon
+    as each one is produced. Only a single item is held in memory at a time.
+    """
+    # Pull the first item before answering, so auth/upstream failures still
+    # surface as a proper HTTP error instead of a truncated 200 stream
+    try:
+        first = await items.__anext__()
+    except StopAsyncIteration:
+        if provider is not None:
+            ITEMS_PER_LOAD.labels(provider).observe(0)
+        return StreamingResponse(iter(()), media_type=NDJSON_MEDIA_TYPE)
+
+    async def body():
+        sent = 0
+        try:
+            yield json.dumps(first.to_dict()) + "\n"
+            sent += 1
+            async for item in items:
+                yield json.dumps(item.to_dict()) + "\n"
+                sent += 1
+        finally:
+            await items.aclose()
+            if provider is not None:
+                ITEMS_PER_LOAD.labels(provider).observe(sent)
+
+    return StreamingResponse(body(), media_type=NDJSON_MEDIA_TYPE)
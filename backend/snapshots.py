@@ -0,0 +1,276 @@
+"""
+Compressed snapshots of the last complete load, per provider and org/user.
+
+Every complete load (not capped, not a delta) stores its IntegrationItems in
+Redis as one zstd-compressed msgpack stream. Rows are stored as arrays in field
+order rather than as objects, so each field name is stored once instead of
+once per item:
+
+    item_snapshot:{<provider>:<scope>}:data   zstd(msgpack({version, fields}) msgpack(row) ...)
+    item_snapshot:{<provider>:<scope>}:meta   hash: version, items, raw_bytes,
+                                              compressed_bytes, build_ms, built_at
+
+SnapshotBuilder packs and compresses rows a batch at a time as a load goes, so
+only the compressed output is held until the snapshot is stored.
+
+POST /integrations/<provider>/items pages and filters the snapshot without
+calling the provider. Decoded rows are kept in a small in-process cache, checked
+against the stored version on every read.
+"""
+
+import os
+import json
+import time
+import asyncio
+import secrets
+from datetime import datetime
+from operator import attrgetter
+from typing import AsyncIterator, List, Optional, Union
+
+import msgpack
+import zstandard
+from fastapi import HTTPException
+
+from fingerprint import token_fingerprint
+from integrations.integration_item import IntegrationItem
+from local_cache import LRUCache
+from metrics import (
+    SNAPSHOT_BUILD_DURATION,
+    SNAPSHOT_BYTES,
+    SNAPSHOT_RETRIEVAL_DURATION,
+    register_local_cache,
+)
+from redis_client import get_hash_redis, get_value_redis, redis_pipeline
+
+ITEM_SNAPSHOT_TTL = int(os.getenv("ITEM_SNAPSHOT_TTL", "86400"))
+# zstd levels 1-19: 3 is zstd's own default, most of the ratio at a fraction of the CPU
+ITEM_SNAPSHOT_ZSTD_LEVEL = int(os.getenv("ITEM_SNAPSHOT_ZSTD_LEVEL", "3"))
+# Decoded snapshots kept in memory per worker
+ITEM_SNAPSHOT_CACHE_SIZE = int(os.getenv("ITEM_SNAPSHOT_CACHE_SIZE", "32"))
+MAX_PAGE_LIMIT = 1000
+# Items packed and compressed per SnapshotBuilder.add() call (one thread hop each)
+SNAPSHOT_BATCH_SIZE = 500
+
+SNAPSHOT_FIELDS = IntegrationItem.__slots__
+_row = attrgetter(*SNAPSHOT_FIELDS)
+
+# (provider, scope) -> (version, fields, rows)
+_decoded = LRUCache(max_size=ITEM_SNAPSHOT_CACHE_SIZE)
+register_local_cache("item_snapshots", _decoded)
+
+
+def _key(provider: str, scope: str, name: str) -> str:
+    # Shared {hash tag}, so data and meta are replaced together in cluster mode too
+    return f"item_snapshot:{{{provider}:{scope}}}:{name}"
+
+
+def snapshot_scope(provider: str, credentials: Union[dict, str]) -> Optional[str]:
+    """
+    Whatever authorises the provider's load route: "org:user" for HubSpot,
+    a fingerprint of the access token for Airtable and Notion. An org/user
+    pair alone never opens a token-authorised provider's snapshot.
+    """
+    if isinstance(credentials, str):
+        try:
+            credentials = json.loads(credentials)
+        except ValueError:
+            return None
+    if not isinstance(credentials, dict):
+        return None
+    if provider == "hubspot":
+        if credentials.get("org_id") and credentials.get("user_id"):
+            return f"{credentials['org_id']}:{credentials['user_id']}"
+        return None
+    if credentials.get("access_token"):
+        return token_fingerprint(credentials["access_token"])
+    return None
+
+
+def is_complete_load(
+    sync_mode: str = "full",
+    return_delta: bool = False,
+    max_pages: Optional[int] = None,
+    max_items: Optional[int] = None,
+) -> bool:
+    """Only loads that return the whole dataset replace the snapshot."""
+    if any(cap is not None and cap < 1 for cap in (max_pages, max_items)):
+        raise HTTPException(status_code=400, detail="max_pages and max_items must be at least 1.")
+    if sync_mode == "incremental":
+        return not return_delta
+    return max_pages is None and max_items is None
+
+
+def _encode_default(value):
+    # Same representation to_dict() gives datetimes
+    if isinstance(value, datetime):
+        return value.isoformat()
+    raise TypeError(f"Cannot store {type(value).__name__} in an item snapshot")
+
+
+def _decode(blob: bytes) -> dict:
+    reader = zstandard.ZstdDecompressor().stream_reader(blob)
+    unpacker = msgpack.Unpacker(reader, raw=False, use_list=False)
+    snapshot = next(unpacker)
+    snapshot["rows"] = tuple(unpacker)
+    return snapshot
+
+
+class SnapshotBuilder:
+    """
+    Encodes one load's snapshot while the load runs: each add() packs and
+    compresses a batch of items, store() writes the result. Only the compressed
+    output is kept, not the items. A load whose credentials have no scope
+    builds nothing.
+    """
+
+    def __init__(self, provider: str, credentials: Union[dict, str]):
+        self.provider = provider
+        self.scope = snapshot_scope(provider, credentials)
+        self.version = secrets.token_hex(8)
+        self.items = 0
+        self.raw_bytes = 0
+        self.build_seconds = 0.0
+        self._packer = msgpack.Packer(default=_encode_default, use_bin_type=True)
+        self._compressor = zstandard.ZstdCompressor(level=ITEM_SNAPSHOT_ZSTD_LEVEL).compressobj()
+        self._compressed = []
+        self._write(self._packer.pack({"version": self.version, "fields": list(SNAPSHOT_FIELDS)}))
+
+    def _write(self, raw: bytes):
+        self.raw_bytes += len(raw)
+        self._compressed.append(self._compressor.compress(raw))
+
+    def _encode(self, items: List[IntegrationItem]):
+        start = time.perf_counter()
+        pack = self._packer.pack
+        self._write(b"".join([pack(_row(item)) for item in items]))
+        self.build_seconds += time.perf_counter() - start
+
+    async def add(self, items: List[IntegrationItem]):
+        """Append `items` to the snapshot."""
+        if self.scope is None or not items:
+            return
+        # Packing and compressing a batch takes milliseconds: keep it off the event loop
+        await asyncio.to_thread(self._encode, items)
+        self.items += len(items)
+
+    async def store(self) -> Optional[dict]:
+        """Replace the snapshot for this load's scope with the items added. Returns its meta."""
+        if self.scope is None:
+            return None
+        self._compressed.append(self._compressor.flush())
+        blob = b"".join(self._compressed)
+        self._compressed = []
+        meta = {
+            "version": self.version,
+            "items": self.items,
+            "raw_bytes": self.raw_bytes,
+            "compressed_bytes": len(blob),
+            "build_ms": round(self.build_seconds * 1000, 3),
+            "built_at": int(time.time()),
+        }
+        provider, scope = self.provider, self.scope
+        async with redis_pipeline() as pipe:
+            pipe.set(_key(provider, scope, "data"), blob, ex=ITEM_SNAPSHOT_TTL)
+            pipe.delete(_key(provider, scope, "meta"))
+            pipe.hset(_key(provider, scope, "meta"), mapping=meta)
+            pipe.expire(_key(provider, scope, "meta"), ITEM_SNAPSHOT_TTL)
+            await pipe.execute()
+        SNAPSHOT_BUILD_DURATION.labels(provider).observe(self.build_seconds)
+        SNAPSHOT_BYTES.labels(provider).observe(len(blob))
+        return meta
+
+
+async def store_item_snapshot(provider: str, credentials: Union[dict, str], items: List[IntegrationItem]) -> Optional[dict]:
+    """Replace the snapshot for this load's scope with `items`. Returns its meta."""
+    builder = SnapshotBuilder(provider, credentials)
+    for start in range(0, len(items), SNAPSHOT_BATCH_SIZE):
+        await builder.add(items[start:start + SNAPSHOT_BATCH_SIZE])
+    return await builder.store()
+
+
+async def with_snapshot(provider: str, credentials: Union[dict, str], items: AsyncIterator) -> AsyncIterator:
+    """
+    Pass a streamed load's `items` through while building their snapshot,
+    stored once the last one went by. A load that fails or is cut short stores nothing.
+    """
+    builder = SnapshotBuilder(provider, credentials)
+    batch = []
+    try:
+        async for item in items:
+            yield item
+            batch.append(item)
+            if len(batch) >= SNAPSHOT_BATCH_SIZE:
+                await builder.add(batch)
+                batch = []
+        await builder.add(batch)
+        await builder.store()
+    finally:
+        await items.aclose()
+
+
+def _decode_meta(meta: dict) -> dict:
+    decoded = {key.decode("utf-8"): value.decode("utf-8") for key, value in meta.items()}
+    for field in ("items", "raw_bytes", "compressed_bytes", "built_at"):
+        decoded[field] = int(decoded[field])
+    decoded["build_ms"] = float(decoded["build_ms"])
+    return decoded
+
+
+async def get_item_snapshot_page(
+    provider: str,
+    credentials: Union[dict, str],
+    offset: int = 0,
+    limit: int = 100,
+    item_type: Optional[str] = None,
+    parent_id: Optional[str] = None,
+) -> dict:
+    """
+    `limit` items from `offset` on, out of the snapshot items matching
+    `item_type` / `parent_id`, plus the snapshot's size and build time.
+    """
+    if offset < 0 or not 1 <= limit <= MAX_PAGE_LIMIT:
+        raise HTTPException(status_code=400, detail=f"offset must be >= 0 and limit between 1 and {MAX_PAGE_LIMIT}.")
+    scope = snapshot_scope(provider, credentials)
+    if scope is None:
+        needed = "'org_id' and 'user_id'" if provider == "hubspot" else "an 'access_token'"
+        raise HTTPException(status_code=400, detail=f"Credentials need {needed}.")
+
+    start = time.perf_counter()
+    meta = await get_hash_redis(_key(provider, scope, "meta"))
+    if not meta:
+        raise HTTPException(status_code=404, detail=f"No {provider} snapshot yet, please load the data first.")
+    meta = _decode_meta(meta)
+
+    cache_key = (provider, scope)
+    cached = _decoded.get(cache_key)
+    source = "local"
+    if cached is None or cached[0] != meta["version"]:
+        blob = await get_value_redis(_key(provider, scope, "data"))
+        if blob is None:
+            raise HTTPException(status_code=404, detail=f"No {provider} snapshot yet, please load the data first.")
+        snapshot = await asyncio.to_thread(_decode, blob)
+        # The blob may be newer than the meta read just before; its own version wins
+        cached = (snapshot["version"], snapshot["fields"], snapshot["rows"])
+        _decoded.set(cache_key, cached, time.time() + ITEM_SNAPSHOT_TTL)
+        source = "redis"
+    _, fields, rows = cached
+
+    if item_type is not None or parent_id is not None:
+        type_index = fields.index("type")
+        parent_index = fields.index("parent_id")
+        rows = [
+            row for row in rows
+            if (item_type is None or row[type_index] == item_type)
+            and (parent_id is None or row[parent_index] == parent_id)
+        ]
+    page = [dict(zip(fields, row)) for row in rows[offset:offset + limit]]
+    retrieval_seconds = time.perf_counter() - start
+    SNAPSHOT_RETRIEVAL_DURATION.labels(provider, source).observe(retrieval_seconds)
+
+    return {
+        "total": len(rows),
+        "offset": offset,
+        "limit": limit,
+        "items": page,
+        "snapshot": {**meta, "source": source, "retrieval_ms": round(retrieval_seconds * 1000, 3)},
+    }
@@ -0,0 +1,64 @@
+"""
+Full HubSpot loads and the watermark incremental loads start from.
+
+    cd backend
+    python -m unittest discover tests
+"""
+
+import time
+import unittest
+from datetime import datetime, timezone
+from unittest import mock
+
+import httpx
+
+from integrations import hubspot
+from integrations.sync_state import SYNC_OVERLAP_SECONDS, sync_since
+
+
+def _iso(millis: int) -> str:
+    return datetime.fromtimestamp(millis / 1000, tz=timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def _contact(contact_id: str, updated_at: int) -> dict:
+    return {
+        "id": contact_id,
+        "createdAt": _iso(updated_at),
+        "updatedAt": _iso(updated_at),
+        "properties": {"firstname": contact_id, "lastname": "Test", "email": f"{contact_id}@example.com"},
+    }
+
+
+class FullLoadWatermarkTest(unittest.IsolatedAsyncioTestCase):
+    async def test_contact_edited_during_full_load_is_in_next_delta(self):
+        load_started = int(time.time() * 1000)
+        # Contact "a" is read on the first page, then edited while the load goes on;
+        # the second page holds a contact edited well past that, beyond the overlap
+        edited_mid_load = load_started + 1000
+        edited_later = edited_mid_load + 2 * SYNC_OVERLAP_SECONDS * 1000
+        pages = {
+            None: {"results": [_contact("a", load_started - 60_000)], "paging": {"next": {"after": "1"}}},
+            "1": {"results": [_contact("b", edited_later)]},
+        }
+
+        async def send_request(provider, method, url, params=None, **kwargs):
+            return httpx.Response(200, json=pages[params.get("after")])
+
+        commit_snapshot = mock.AsyncMock()
+        with mock.patch.object(hubspot, "get_valid_hubspot_access_token", mock.AsyncMock(return_value="token")), \
+                mock.patch.object(hubspot, "send_request", send_request), \
+                mock.patch.object(hubspot, "stage_snapshot_records", mock.AsyncMock()), \
+                mock.patch.object(hubspot, "discard_staging", mock.AsyncMock()), \
+                mock.patch.object(hubspot, "commit_snapshot", commit_snapshot):
+            items = [item async for item in hubspot.iter_items_hubspot({"org_id": "o", "user_id": "u"})]
+
+        self.assertEqual([item.id for item in items], ["a", "b"])
+        commit_snapshot.assert_awaited_once()
+        watermark = commit_snapshot.await_args.args[3]
+        self.assertGreaterEqual(watermark, load_started)
+        # The next incremental load has to read changes from before the mid-load edit
+        self.assertLessEqual(sync_since(watermark), edited_mid_load)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,67 @@
+"""
+Full Notion loads and the watermark incremental loads start from.
+
+    cd backend
+    python -m unittest discover tests
+"""
+
+import json
+import time
+import unittest
+from datetime import datetime, timezone
+from unittest import mock
+
+import httpx
+
+from integrations import notion
+from integrations.sync_state import SYNC_OVERLAP_SECONDS, sync_since
+
+
+def _iso(millis: int) -> str:
+    return datetime.fromtimestamp(millis / 1000, tz=timezone.utc).isoformat().replace("+00:00", "Z")
+
+
+def _page(page_id: str, edited_at: int) -> dict:
+    return {
+        "object": "page",
+        "id": page_id,
+        "created_time": _iso(edited_at),
+        "last_edited_time": _iso(edited_at),
+        "parent": {"type": "workspace", "workspace": True},
+        "properties": {"Name": {"type": "title", "title": [{"plain_text": page_id}]}},
+    }
+
+
+class FullLoadWatermarkTest(unittest.IsolatedAsyncioTestCase):
+    async def test_page_edited_during_full_load_is_in_next_delta(self):
+        load_started = int(time.time() * 1000)
+        # Page "a" is read first, then edited while the search walk goes on;
+        # the next results hold a page edited well past that, beyond the overlap
+        edited_mid_load = load_started + 1000
+        edited_later = edited_mid_load + 2 * SYNC_OVERLAP_SECONDS * 1000
+        results = {
+            None: {"results": [_page("a", load_started - 60_000)], "has_more": True, "next_cursor": "1"},
+            "1": {"results": [_page("b", edited_later)], "has_more": False, "next_cursor": None},
+        }
+
+        async def send_request(provider, method, url, json=None, **kwargs):
+            return httpx.Response(200, json=results[json.get("start_cursor")])
+
+        commit_snapshot = mock.AsyncMock()
+        with mock.patch.object(notion, "send_request", send_request), \
+                mock.patch.object(notion, "stage_snapshot_records", mock.AsyncMock()), \
+                mock.patch.object(notion, "discard_staging", mock.AsyncMock()), \
+                mock.patch.object(notion, "commit_snapshot", commit_snapshot):
+            credentials = json.dumps({"access_token": "token", "bot_id": "bot"})
+            items = [item async for item in notion.iter_items_notion(credentials)]
+
+        self.assertEqual([item.id for item in items], ["a", "b"])
+        commit_snapshot.assert_awaited_once()
+        watermark = commit_snapshot.await_args.args[3]
+        self.assertGreaterEqual(watermark, load_started)
+        # The next incremental load has to read changes from before the mid-load edit
+        self.assertLessEqual(sync_since(watermark), edited_mid_load)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,157 @@
+import os
+import functools
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+# Optional OpenTelemetry tracing. Off unless OTEL_TRACING_EXPORTER is set and
+# the opentelemetry packages (requirements-tracing.txt) are installed; every
+# helper here is then a no-op and `traced` returns functions unwrapped.
+#   otlp     -> OTLP/HTTP, to OTEL_EXPORTER_OTLP_ENDPOINT (default localhost:4318)
+#   file     -> one JSON span per line in OTEL_TRACING_FILE
+#   console  -> spans printed to stdout
+OTEL_TRACING_EXPORTER = os.getenv("OTEL_TRACING_EXPORTER", "none").lower()
+OTEL_TRACING_FILE = os.getenv("OTEL_TRACING_FILE", "traces.jsonl")
+OTEL_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "integrations-backend")
+
+try:
+    from opentelemetry import trace
+    from opentelemetry.sdk.resources import Resource
+    from opentelemetry.sdk.trace import TracerProvider
+    from opentelemetry.sdk.trace.export import BatchSpanProcessor, ConsoleSpanExporter
+    from opentelemetry.trace import SpanKind, Status, StatusCode
+except ImportError:
+    trace = None
+
+_tracer = None
+# The server span of the request being handled, so code deep in a request can
+# tag it with org/user without threading the span through
+_request_span: ContextVar = ContextVar("request_span", default=None)
+
+
+def _build_exporter():
+    if OTEL_TRACING_EXPORTER == "otlp":
+        from opentelemetry.exporter.otlp.proto.http.trace_exporter import OTLPSpanExporter
+
+        return OTLPSpanExporter()
+    if OTEL_TRACING_EXPORTER == "file":
+        out = open(OTEL_TRACING_FILE, "a")
+        return ConsoleSpanExporter(out=out, formatter=lambda span: span.to_json(indent=None) + "\n")
+    if OTEL_TRACING_EXPORTER == "console":
+        return ConsoleSpanExporter()
+    raise ValueError(f"Unknown OTEL_TRACING_EXPORTER '{OTEL_TRACING_EXPORTER}'")
+
+
+def init_tracing():
+    """Set up the tracer provider once, at import time of main."""
+    global _tracer
+    if _tracer is not None or trace is None or OTEL_TRACING_EXPORTER in ("", "none"):
+        return
+    provider = TracerProvider(resource=Resource.create({"service.name": OTEL_SERVICE_NAME}))
+    provider.add_span_processor(BatchSpanProcessor(_build_exporter()))
+    trace.set_tracer_provider(provider)
+    _tracer = trace.get_tracer("integrations-backend")
+
+
+def shutdown_tracing():
+    """Flush spans still buffered in the batch processor."""
+    if _tracer is not None:
+        trace.get_tracer_provider().shutdown()
+
+
+def _set_attributes(target, attributes: dict):
+    for key, value in attributes.items():
+        if value is not None:
+            target.set_attribute(key, value if isinstance(value, (bool, int, float)) else str(value))
+
+
+class _NoopSpan:
+    def set_attribute(self, key, value):
+        pass
+
+    def rename(self, name):
+        pass
+
+    def set_attributes(self, **attributes):
+        pass
+
+
+class _Span:
+    """Thin wrapper so callers can add attributes without importing opentelemetry."""
+
+    def __init__(self, span):
+        self.span = span
+
+    def set_attribute(self, key, value):
+        _set_attributes(self.span, {key: value})
+
+    def rename(self, name):
+        self.span.update_name(name)
+
+    def set_attributes(self, **attributes):
+        _set_attributes(self.span, attributes)
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+@contextmanager
+def span(name: str, kind: Optional[str] = None, **attributes):
+    """
+    `with span("hubspot.refresh_token", org_id=...) as s:` — a child of the
+    current span. Only use around awaits in a plain coroutine, never across a
+    `yield` of an async generator.
+    """
+    if _tracer is None:
+        yield _NOOP_SPAN
+        return
+    span_kind = {"server": SpanKind.SERVER, "client": SpanKind.CLIENT}.get(kind, SpanKind.INTERNAL)
+    with _tracer.start_as_current_span(name, kind=span_kind) as current:
+        _set_attributes(current, attributes)
+        yield _Span(current)
+
+
+@contextmanager
+def request_span(name: str, **attributes):
+    """The server span for one request; tag_request() adds to it from anywhere below."""
+    with span(name, kind="server", **attributes) as current:
+        token = _request_span.set(current)
+        try:
+            yield current
+        finally:
+            _request_span.reset(token)
+
+
+def tag_request(**attributes):
+    """Add attributes (org_id, user_id, ...) to the current request's span."""
+    current = _request_span.get()
+    if current is not None:
+        current.set_attributes(**attributes)
+
+
+def mark_error(current, status_code: int):
+    """Flag a span as failed, e.g. for a 5xx response."""
+    if isinstance(current, _Span):
+        current.span.set_status(Status(StatusCode.ERROR, f"HTTP {status_code}"))
+
+
+def traced(name: str, **attributes):
+    """
+    Decorator wrapping a coroutine function in a span. Resolved at import time:
+    with tracing off the function is returned as-is, at no cost per call.
+    """
+    def decorator(func):
+        if _tracer is None:
+            return func
+
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(name, **attributes):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# Decorators like `traced` are applied when modules import, so the provider has
+# to exist before main imports the integrations
+init_tracing()